@@ -1,19 +1,36 @@
-from flask import Flask, render_template, request, jsonify, send_file
+# Imported first so the startup report also covers the imports below
+from startup import StartupReport, Once
+from response_cache import ResponseCache
+from audit import AuditLog
+from principals import Principal, PrincipalCache, TokenMemo
+from passwords import PasswordPool, PasswordPoolBusy
+startup = StartupReport()
+
+from flask import Flask, render_template, request, jsonify, stream_with_context
 from flask_cors import CORS
-from models import db, User, Feedback, Product, ActivityLog
+from models import db, User, Feedback, Product, ActivityLog, DailyRollup, TermCount, TermTotal
+from werkzeug.datastructures import MultiDict
+from sqlalchemy import event, tuple_
+from sqlalchemy.orm import Session, joinedload
+import rollups
+import migrations
+import query_plans
 from datetime import datetime, timedelta
+from time import perf_counter
 import jwt
+import click
 import os
 from functools import wraps
 import csv
 import io
-from collections import Counter
+import json
+import base64
+import zlib
 import re
 import sys
-import random
 # ========== NLTK RUNTIME PATH FIX ==========
 import nltk
-from textblob import TextBlob
+startup.mark('imports')
 
 # This is the directory our build script downloads to
 NLTK_DATA_DIR = '/opt/render/nltk_data'
@@ -34,41 +51,61 @@ if os.path.exists(NLTK_DATA_DIR):
     print(f"✅ SUCCESS: NLTK data path manually set to: {NLTK_DATA_DIR}")
 else:
     print(f"❌ FATAL: NLTK data directory NOT FOUND at: {NLTK_DATA_DIR}")
+startup.mark('nltk_path')
 # ============================================
 
 # --- ROBUST GEMINI (CHATBOT) SETUP ---
-import google.generativeai as genai
+# Resolved on the first chat message, not at import: probing every model costs
+# up to 10s each and used to run in every gunicorn worker on boot.
 GENAI_KEY = os.environ.get('GOOGLE_API_KEY')
-chat_model = None
-
-if GENAI_KEY:
-    genai.configure(api_key=GENAI_KEY)
-    # UPDATED: List of models your key actually supports
-    POSSIBLE_MODELS = [
-        'gemini-2.5-flash',
-        'gemini-2.0-flash-exp',
-        'gemini-1.5-flash',
-        'gemini-pro'
-    ]
-    
-    print("\n🤖 Connecting to AI...")
-    for model_name in POSSIBLE_MODELS:
-        try:
-            # Try to initialize and run a quick test
-            temp_model = genai.GenerativeModel(model_name)
-            # A dummy generation to ensure it actually works
-            temp_model.generate_content("test", request_options={'timeout': 10}) 
-            chat_model = temp_model
-            print(f"✅ SUCCESS: Connected to Gemini using model: '{model_name}'\n")
-            break
-        except Exception:
-             continue
-
-    if not chat_model:
+# UPDATED: List of models your key actually supports
+POSSIBLE_MODELS = [
+    'gemini-2.5-flash',
+    'gemini-2.0-flash-exp',
+    'gemini-1.5-flash',
+    'gemini-pro'
+]
+
+# Total seconds the model probe may take; keep it under gunicorn's 30 s worker timeout
+GEMINI_PROBE_BUDGET = float(os.environ.get('GEMINI_PROBE_BUDGET', 20))
+
+def resolve_chat_model():
+    if not GENAI_KEY:
+        print("ℹ️ NOTICE: GOOGLE_API_KEY not set. Chatbot disabled.\n")
+        return None
+
+    with startup.phase('chat_model', lazy=True):
+        import google.generativeai as genai
+        genai.configure(api_key=GENAI_KEY)
+
+        # GEMINI_MODEL pins the model for the deployment and skips the probe entirely
+        if os.environ.get('GEMINI_MODEL'):
+            return genai.GenerativeModel(os.environ['GEMINI_MODEL'])
+
+        print("\n🤖 Connecting to AI...")
+        deadline = perf_counter() + GEMINI_PROBE_BUDGET
+        for model_name in POSSIBLE_MODELS:
+            remaining = deadline - perf_counter()
+            if remaining < 1:
+                break
+            try:
+                # Try to initialize and run a quick test
+                temp_model = genai.GenerativeModel(model_name)
+                # A dummy generation to ensure it actually works
+                temp_model.generate_content("test", request_options={'timeout': min(10, remaining)})
+                print(f"✅ SUCCESS: Connected to Gemini using model: '{model_name}'\n")
+                return temp_model
+            except Exception:
+                continue
+
         print("\n❌ ERROR: Still could not connect to any Gemini model.")
         print("Please check your API key and internet connection.\n")
-else:
-    print("ℹ️ NOTICE: GOOGLE_API_KEY not set. Chatbot disabled.\n")
+        return None
+
+# The probe runs inside the first /api/chat request. Other chat requests get a
+# 503 meanwhile instead of queueing behind it, and a failed probe is retried
+# after GEMINI_RETRY_SECONDS rather than disabling the chatbot until restart.
+get_chat_model = Once(resolve_chat_model, retry_after=float(os.environ.get('GEMINI_RETRY_SECONDS', 60)), wait=False)
 
 # ========== CRITICAL: FIX IMPORTS FOR SIBLING FOLDERS ==========
 # 1. Get the path to the 'backend' folder where this file lives
@@ -82,23 +119,87 @@ CURRENT_DIR = BASE_DIR  # ADD THIS LINE
 if PROJECT_ROOT not in sys.path: sys.path.append(PROJECT_ROOT)
 if CODE_DIR not in sys.path: sys.path.append(CODE_DIR)
 
-# 5. Tell ML script where the model file is specifically
-os.environ['LEAD_MODEL_PATH'] = os.path.join(PROJECT_ROOT, 'models', 'lead_pipeline.joblib')
+# 5. Tell ML script where the model file is specifically (a .npz path selects the linear engine)
+os.environ.setdefault('LEAD_MODEL_PATH', os.path.join(PROJECT_ROOT, 'models', 'lead_pipeline.joblib'))
 # ===============================================================
 
+from sentiment import SENTIMENT, sentiment_label
+import lead_import
+
 try:
-    from predict_today import load_model, predict_probability
-    ml_model = load_model()
-    if ml_model:
-        print(f"ML SUCCESS: Model loaded from {os.environ['LEAD_MODEL_PATH']}")
-    else:
-        print("ML WARNING: Imported modules, but model file failed to load.")
+    from predict_today import predict_lead, predict_leads, predict_probabilities, PREDICTION_CACHE
+    from text_cleaner import LEMMA_CACHE
+    from batching import MicroBatcher
+    from model_registry import ModelRegistry
+    import lead_updater
 except ImportError as e:
     print(f"ML CRITICAL: Could not find 'predict_today.py' in {CODE_DIR}")
     print(f"Python is looking in: {sys.path}")
-    ml_model, predict_probability = None, None
+    predict_lead, predict_leads = None, None
+    PREDICTION_CACHE, LEMMA_CACHE, MicroBatcher, ModelRegistry, lead_updater = None, None, None, None, None
+startup.mark('ml_imports')
 # ---------------------
 
+# The registry owns the one resident copy of the lead model and hot-swaps it when
+# LEAD_MODEL_PATH (a file, or a directory of versioned artifacts) changes
+ml_registry = ModelRegistry(
+    os.environ.get('LEAD_MODEL_DIR') or os.environ['LEAD_MODEL_PATH'],
+    poll_interval=float(os.environ.get('MODEL_POLL_INTERVAL', 30)),
+) if ModelRegistry else None
+
+def score_batch(items):
+    """MicroBatcher fn: items are (model, text) so a batch never mixes model versions."""
+    out = [None] * len(items)
+    groups = {}
+    for i, (model, _) in enumerate(items):
+        groups.setdefault(id(model), (model, []))[1].append(i)
+    for model, idx in groups.values():
+        for i, p in zip(idx, predict_probabilities(model, [items[i][1] for i in idx])):
+            out[i] = p
+    return out
+
+# Concurrent single-note predictions are coalesced into one predict_proba call
+lead_batcher = MicroBatcher(
+    score_batch,
+    max_batch_size=int(os.environ.get('LEAD_BATCH_MAX_SIZE', 32)),
+    max_wait_ms=float(os.environ.get('LEAD_BATCH_WAIT_MS', 5)),
+) if MicroBatcher else None
+
+def _first_model_load():
+    with startup.phase('ml_model', lazy=True):
+        model, version = ml_registry.get()
+    if model is not None:
+        print(f"SUCCESS: Lead prediction model loaded (version {version}).")
+    else:
+        print("WARNING: Lead prediction model failed to load.")
+
+first_model_load = Once(_first_model_load)
+
+def get_lead_model():
+    """(model, version) currently serving, or (None, None). Loaded on first use."""
+    if not ml_registry:
+        return (None, None)
+    first_model_load()
+    return ml_registry.get()
+
+def batched_scorer(model):
+    return lambda texts: lead_batcher.submit_many([(model, t) for t in texts])
+
+# Upper bound on notes per batch request, keeps one request from pinning a worker
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 1000))
+# Rows scored and inserted per transaction by CSV imports; bounds their memory
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 500))
+# Checkpoint of the incrementally trained model (code/online_model.py); serve it by
+# pointing LEAD_MODEL_PATH here too
+ONLINE_MODEL_PATH = os.environ.get('ONLINE_MODEL_PATH', os.path.join(PROJECT_ROOT, 'models', 'lead_online.joblib'))
+
+def import_scorer():
+    """(score_leads, version) for a bulk import: one model version throughout, prediction cache bypassed."""
+    ml_model, ml_version = get_lead_model()
+    if not ml_model:
+        return None, None
+    return (lambda texts: predict_leads(ml_model, texts, cache=None)), ml_version
+
 app = Flask(__name__, template_folder=os.path.join(CURRENT_DIR, 'templates'), 
             static_folder=os.path.join(CURRENT_DIR, 'static'))
 
@@ -115,106 +216,209 @@ app.config['SQLALCHEMY_DATABASE_URI'] = database_url or 'sqlite:///' + os.path.j
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 CORS(app)
-with app.app_context():
-    db.create_all()
-    print("🌱 Checking database status...")
-
-    # 1. Seed Users
-    if not User.query.first():
-        print("👤 No users found. Seeding default users...")
-        dev = User(username='dev', role='dev'); dev.set_password('dev123')
-        mgr = User(username='manager', role='manager'); mgr.set_password('manager123')
-        sls = User(username='sales', role='salesperson'); sls.set_password('sales123')
-        db.session.add_all([dev, mgr, sls])
-        db.session.commit()
-        print("✅ Users seeded.")
-
-    # 2. Seed Products
-    if not Product.query.first():
-        print("📦 No products found. Seeding samples...")
-        db.session.add_all([
-            Product(name='Enterprise AI Suite', description='Full AI integration platform', details='Unlimited API calls, dedicated support', catalogue_info='SKU: AI-ENT-001'),
-            Product(name='Startup Starter Pack', description='Essential tools for small teams', details='Basic AI features, email support', catalogue_info='SKU: ST-BAS-101'),
-            Product(name='Consulting Services', description='Expert implementation help', details='Hourly rate, onsite available', catalogue_info='SKU: SRV-CON-999')
-        ])
+startup.mark('app_config')
+
+# ActivityLog rows are written behind the request by a background flusher
+audit_log = AuditLog(
+    app,
+    maxsize=int(os.environ.get('AUDIT_QUEUE_SIZE', 10000)),
+    batch_size=int(os.environ.get('AUDIT_BATCH_SIZE', 200)),
+    flush_interval=float(os.environ.get('AUDIT_FLUSH_MS', 1000)) / 1000,
+    background=os.environ.get('AUDIT_ASYNC', '1') == '1',
+)
+
+# Serialized /api/dashboard payload; write paths bump its version
+dashboard_cache = ResponseCache(ttl=float(os.environ.get('DASHBOARD_CACHE_TTL', 15)))
+
+# ========== DATABASE: explicit commands + lazy schema check ==========
+# Seeding is no longer an import side effect. Run once per deployment:
+#   flask --app app init-db     (create missing tables)
+#   flask --app app seed-db     (default users, products and demo dashboard data)
+AUTO_CREATE_SCHEMA = os.environ.get('AUTO_CREATE_SCHEMA', '1') == '1'
+
+def _ensure_schema():
+    with startup.phase('schema', lazy=True):
+        db.create_all()
+
+ensure_schema = Once(_ensure_schema)
+
+@app.before_request
+def lazy_init():
+    # Fallback for deployments that skip init-db; create_all only adds missing tables
+    if AUTO_CREATE_SCHEMA:
+        ensure_schema()
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create missing tables and apply pending migrations (non-destructive)."""
+    migrations.upgrade()
+    print("✅ Database schema is up to date.")
+    # First deploy with the rollup/term tables: backfill them from existing feedback
+    if Feedback.query.first() and not (DailyRollup.query.first() and TermTotal.query.first()):
+        print(f"✅ Backfilled {rollups.rebuild()} daily rollup rows.")
         db.session.commit()
-        print("✅ Products seeded.")
-
-    # 3. Seed Dashboard Data (Feedback)
-    if not Feedback.query.first():
-        print("📊 No feedback found. Seeding dashboard data...")
-        sales_user = User.query.filter_by(role='salesperson').first()
-        
-        if sales_user:
-            # --- 1. SEED 20 SAMPLE LEADS ---
-            print("...Seeding 20 sample leads...")
-            lead_samples = [
-                ("Loved the demo, budget approved, wants to start next week.", 0.95, "High"),
-                ("Very keen! Asked for a custom quote for 500 seats. Hot lead!", 0.98, "High"),
-                ("Meeting went okay. They liked Feature A. Need to nurture.", 0.55, "Medium"),
-                ("Just looking around, no immediate need. Maybe next year.", 0.20, "Low"),
-                ("Stuck in an existing contract for 6 months. Call back later.", 0.30, "Low"),
-                ("Great conversation. Decision maker needs approval from CEO.", 0.75, "High"),
-                ("Standard inquiry, sent pricing sheet. Waiting to hear back.", 0.50, "Medium"),
-                ("Had technical issues during the demo, they got frustrated.", 0.15, "Low"),
-                ("Impressed by the AI features. Wants a follow-up with their CTO.", 0.92, "High"),
-                ("Their team is too small for the Enterprise plan, pitched Startup pack.", 0.45, "Medium"),
-            ]
-            for _ in range(2): # Loop 2 times
-                for text, score, label in lead_samples: # 10 samples
-                    days_ago = random.randint(0, 9)
-                    fb = Feedback(
-                        salesperson_id=sales_user.id, 
-                        text=text, 
-                        lead_score=score,    # <-- Use lead columns
-                        lead_label=label,    # <-- Use lead columns
-                        status='lead',       # <-- Set status
-                        timestamp=datetime.utcnow() - timedelta(days=days_ago)
-                    )
-                    db.session.add(fb)
-
-            # --- 2. SEED 20 SAMPLE FEEDBACK (with sentiment) ---
-            print("...Seeding 20 sample feedback entries...")
-            feedback_samples = [
-                ("I am extremely happy with the support team, solved my issue in 5 minutes!", 0.9, "Positive"),
-                ("The new update is fantastic, everything runs so much faster.", 0.8, "Positive"),
-                ("It's an okay product, but it's missing a few key features.", 0.1, "Neutral"),
-                ("I am so frustrated. The app crashed and I lost all my work.", -0.8, "Negative"),
-                ("The pricing is way too high for what you get.", -0.5, "Negative"),
-                ("The documentation is unclear and hard to follow.", -0.4, "Negative"),
-                ("I like the product, it does exactly what it says it will do.", 0.6, "Positive"),
-                ("The user interface is a bit clunky but it works.", 0.2, "Neutral"),
-                ("Your competitor offers the same thing for half the price.", -0.3, "Negative"),
-                ("Just wanted to say thanks, this tool saved me hours of work.", 1.0, "Positive"),
-            ]
-            for _ in range(2): # Loop 2 times
-                for text, score, label in feedback_samples: # 10 samples
-                    days_ago = random.randint(0, 9)
-                    fb = Feedback(
-                        salesperson_id=sales_user.id, 
-                        text=text, 
-                        sentiment_score=score, # <-- Use sentiment columns
-                        sentiment_label=label, # <-- Use sentiment columns
-                        status='feedback',     # <-- Set status
-                        timestamp=datetime.utcnow() - timedelta(days=days_ago)
-                    )
-                    db.session.add(fb)
-
-            db.session.commit()
-            print("✅ Dashboard data (40 entries) seeded!")
-        else:
-            print("❌ ERROR: 'salesperson' user not found. Cannot seed data.")
+
+@app.cli.command('rebuild-rollups')
+@click.option('--start', default=None, help='First day to rebuild (YYYY-MM-DD); default: all history')
+@click.option('--end', default=None, help='Last day to rebuild (YYYY-MM-DD); default: all history')
+def rebuild_rollups_command(start, end):
+    """Recompute daily_rollups from the feedbacks table (backfill / repair)."""
+    n = rollups.rebuild(rollups.parse_day(start), rollups.parse_day(end))
+    db.session.commit()
+    dashboard_cache.bump()
+    print(f"✅ Rebuilt {n} daily rollup rows.")
+
+@app.cli.command('import-leads')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--salesperson', required=True, help='Username the leads are filed under')
+@click.option('--batch-size', default=IMPORT_BATCH_SIZE, show_default=True, help='Rows scored and inserted per transaction')
+def import_leads_command(path, salesperson, batch_size):
+    """Bulk-import leads from a CSV export (text or note_text column, optional timestamp)."""
+    user = User.query.filter_by(username=salesperson, role='salesperson').first()
+    if not user:
+        raise click.ClickException(f"No salesperson named {salesperson!r}")
+    score_leads, ml_version = import_scorer()
+    if not score_leads:
+        print("⚠️ Lead model not loaded; rows are imported without lead scores.")
+    with open(path, 'rb') as fh:
+        try:
+            reader, text_index, timestamp_index = lead_import.open_csv(fh)
+        except (ValueError, UnicodeDecodeError) as e:
+            raise click.ClickException(f"Invalid CSV: {e}")
+        rows = lead_import.parse_rows(reader, text_index, timestamp_index)
+        for event in lead_import.import_leads(rows, user.id, score_leads, batch_size):
+            if event['event'] == 'error':
+                print(f"   line {event['line']}: {event['error']}")
+            elif event['event'] == 'progress':
+                print(f"... {event['rows']} rows, {event['imported']} imported, {event['failed']} failed "
+                      f"({event['rows_per_sec']} rows/s)")
+            elif event['aborted']:
+                print(f"❌ Stopped reading the file: {event['aborted']}")
+    print(f"✅ Imported {event['imported']} of {event['rows']} rows in {event['seconds']} s "
+          f"(model {ml_version or 'none'}).")
+
+@app.cli.command('update-lead-model')
+@click.option('--model', 'path', default=ONLINE_MODEL_PATH, show_default=True, help='Online model checkpoint (created if missing)')
+@click.option('--batch-size', default=500, show_default=True, type=click.IntRange(min=1), help='Labeled rows per partial_fit')
+@click.option('--max-rows', default=None, type=click.IntRange(min=1), help='Stop after this many rows; the next run resumes there')
+@click.option('--reset', is_flag=True, help='Start a fresh model and relearn every labeled row')
+def update_lead_model_command(path, batch_size, max_rows, reset):
+    """Teach the online lead model the outcomes recorded since its last update (run from cron)."""
+    if not lead_updater:
+        raise click.ClickException("ML module not available")
+    r = lead_updater.update_model(path, batch_size=batch_size, max_rows=max_rows, reset=reset)
+    if not r['saved']:
+        print(f"✅ No new outcomes since {r['since'] or 'the beginning'}; {path} unchanged.")
+        return
+    print(f"✅ Learned {r['rows']} outcomes in {r['batches']} batches ({r['seconds']} s); "
+          f"{r['total_seen']} in total, up to {r['watermark']}. Saved {path}.")
+
+@app.cli.command('train-online-model')
+@click.option('--model', 'path', default=ONLINE_MODEL_PATH, show_default=True, help='Online model checkpoint to (over)write')
+@click.option('--epochs', default=5, show_default=True, type=click.IntRange(min=1))
+@click.option('--holdout', default=10000, show_default=True, type=click.IntRange(min=0), help='Rows reservoir-sampled for evaluation')
+@click.option('--chunksize', default=10000, show_default=True, type=click.IntRange(min=1), help='Rows fetched from the cursor at a time')
+def train_online_model_command(path, epochs, holdout, chunksize):
+    """Train the online lead model from scratch on every labeled row, streamed from the database."""
+    if not lead_updater:
+        raise click.ClickException("ML module not available")
+    r = lead_updater.train_from_db(path, epochs=epochs, holdout=holdout, chunksize=chunksize)
+    if r is None:
+        raise click.ClickException("No labeled feedback yet; record outcomes first")
+    print(f"✅ Trained on {r['trained']} outcomes x {r['epochs']} epochs in {r['seconds']} s, up to {r['watermark']}; "
+          f"{r['held_out']} held out (F1 {r.get('holdout_f1', 'n/a')}). Peak memory {r['peak_mb']} MB. Saved {path}.")
+
+@app.cli.command('migration-status')
+def migration_status_command():
+    """List schema migrations and whether each has been applied."""
+    for m in migrations.status():
+        print(f"{'✅' if m['applied'] else '⏳'} {m['version']:>3} {m['name']}")
+
+def key_queries():
+    """The filtered/ordered queries the API runs on large tables, for check-queries."""
+    day = datetime.utcnow().date()
+    since = datetime.utcnow() - timedelta(days=7)
+    return {
+        'recent feedback': Feedback.query.order_by(Feedback.timestamp.desc()).limit(10),
+        'report by date range': report_query(MultiDict({'from': str(day - timedelta(days=30)), 'to': str(day)})),
+        'report by salesperson': report_query(MultiDict({'salesperson_id': '1'})),
+        'report by lead label': report_query(MultiDict({'label': 'High'})),
+        'report by sentiment': report_query(MultiDict({'sentiment': 'Positive'})),
+        'report by status': report_query(MultiDict({'status': 'lead'})),
+        'feedback page (keyset)': feedback_page_query(MultiDict(), (datetime.utcnow(), 1 << 30)).limit(51),
+        'salesperson feedback page (keyset)': feedback_page_query(
+            MultiDict({'salesperson_id': '1'}), (datetime.utcnow(), 1 << 30)).limit(51),
+        'feedback since': Feedback.query.filter(Feedback.timestamp >= since),
+        'activity log': ActivityLog.query.order_by(ActivityLog.timestamp.desc()).limit(100),
+        'activity by user': ActivityLog.query.filter(ActivityLog.user_id == 1),
+        'login lookup': User.query.filter_by(username='sales', role='salesperson'),
+        'salespeople': User.query.filter_by(role='salesperson'),
+        'rollups by day range': DailyRollup.query.filter(DailyRollup.day >= day - timedelta(days=6), DailyRollup.day <= day),
+        'rollups by salesperson': DailyRollup.query.filter(DailyRollup.salesperson_id == 1),
+        'top terms': TermTotal.query.filter(TermTotal.lead_label == 'High', TermTotal.count > 0)
+            .order_by(TermTotal.count.desc(), TermTotal.term).limit(50),
+        'terms by day range': TermCount.query.filter(TermCount.day >= day - timedelta(days=6)),
+        'terms by salesperson': TermCount.query.filter(TermCount.salesperson_id == 1),
+    }
+
+@app.cli.command('check-queries')
+def check_queries_command():
+    """EXPLAIN the key queries; exit 1 if any of them scans a whole table."""
+    failed = query_plans.check(key_queries())
+    if failed:
+        raise SystemExit(f"❌ Full table scan in: {', '.join(failed)}")
+    print("✅ Every key query uses an index.")
+
+@app.cli.command('seed-db')
+def seed_db_command():
+    """Seed default users, products and sample dashboard data into empty tables."""
+    from seed_data import seed_defaults
+    migrations.upgrade()
+    seed_defaults()
 # =======================================================
-# --- LOAD ML MODEL AT STARTUP ---
-ml_model = None
-if load_model:
-    ml_model = load_model()
-    if ml_model:
-        print("SUCCESS: Lead prediction model loaded.")
-    else:
-        print("WARNING: Lead prediction model failed to load.")
-# --------------------------------
 # JWT token decorator
+def load_principal(user_id):
+    user = db.session.get(User, user_id)
+    return Principal(user.id, user.role, user.username) if user else None
+
+# Authenticated requests resolve the user from these instead of querying users each time
+principal_cache = PrincipalCache(
+    load_principal,
+    ttl=float(os.environ.get('PRINCIPAL_CACHE_TTL', 30)),
+    epoch_path=os.path.join(app.instance_path, 'auth_epoch'),
+)
+# A role change is noted at flush and invalidated only once it has committed;
+# invalidating at flush would let another worker re-cache the old role from the
+# database before the new one is visible
+@event.listens_for(User, 'after_update')
+def note_role_change(mapper, connection, target):
+    state = db.inspect(target)
+    if state.attrs.role.history.has_changes():
+        state.session.info.setdefault('role_changed', set()).add(target.id)
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_principals_on_commit(session):
+    for user_id in session.info.pop('role_changed', ()):
+        principal_cache.invalidate(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def forget_role_changes_on_rollback(session):
+    session.info.pop('role_changed', None)
+
+# Login/registration KDFs run here, off the request thread; saturation answers 503
+password_pool = PasswordPool(
+    workers=int(os.environ.get('PASSWORD_WORKERS', 1)),
+    max_pending=int(os.environ.get('PASSWORD_MAX_PENDING', 4)),
+    timeout=float(os.environ.get('PASSWORD_TIMEOUT', 5)),
+)
+
+def password_busy():
+    response = jsonify({'error': 'Too many logins in progress, please retry in a moment'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+decode_token = TokenMemo(lambda token: jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256']))
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -222,8 +426,8 @@ def token_required(f):
         if not token: return jsonify({'error': 'Token is missing'}), 401
         try:
             token = token.split(' ')[1]  # Remove 'Bearer ' prefix
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-            current_user = User.query.get(data['user_id'])
+            data = decode_token(token)
+            current_user = principal_cache.get(data['user_id'])
             if not current_user: return jsonify({'error': 'Invalid token'}), 401
         except Exception: return jsonify({'error': 'Invalid token'}), 401
         return f(current_user, *args, **kwargs)
@@ -280,16 +484,27 @@ def login():
         return jsonify({'error': 'Missing credentials'}), 400
     
     user = User.query.filter_by(username=username, role=role).first()
+    pwhash = user.password_hash if user else None
+    db.session.commit()  # hand the connection back to the pool for the length of the KDF
     
-    if not user or not user.check_password(password):
-        return jsonify({'error': 'Invalid credentials'}), 401
+    try:
+        if not user or not password_pool.verify(pwhash, password):
+            return jsonify({'error': 'Invalid credentials'}), 401
+    except PasswordPoolBusy:
+        return password_busy()
+    if password_pool.needs_rehash(pwhash):
+        # Hash parameters changed since this password was set; upgrade it now we know it
+        try:
+            user.password_hash = password_pool.hash(password)
+        except PasswordPoolBusy:
+            pass  # the next login will retry
     
     user.last_login = datetime.utcnow()
     try:
-        db.session.add(ActivityLog(user_id=user.id, action='login', details=f'User logged in as {role}'))
         db.session.commit()
     except:
         db.session.rollback()
+    audit_log.record(user.id, 'login', f'User logged in as {role}')
     
     token = jwt.encode({
         'user_id': user.id,
@@ -316,16 +531,14 @@ def register():
     if User.query.filter_by(username=username).first():
         return jsonify({'error': 'Username already exists'}), 400
 
-    new_user = User(username=username, role=role)
-    new_user.set_password(password)
+    try:
+        new_user = User(username=username, role=role, password_hash=password_pool.hash(password))
+    except PasswordPoolBusy:
+        return password_busy()
     db.session.add(new_user)
     db.session.commit()
 
-    try:
-        db.session.add(ActivityLog(user_id=new_user.id, action='register', details=f'New user self-registered: {username} ({role})'))
-        db.session.commit()
-    except:
-        db.session.rollback()
+    audit_log.record(new_user.id, 'register', f'New user self-registered: {username} ({role})')
 
     return jsonify({'message': 'Registration successful! Please login.'}), 201
 
@@ -344,12 +557,10 @@ def submit_lead(current_user):
     # --- ML SCORING (FOR LEADS) ---
     lead_score = None
     lead_label = None
-    if ml_model and predict_probability:
+    ml_model, ml_version = get_lead_model()
+    if ml_model:
         try:
-            lead_score = predict_probability(ml_model, text)
-            if lead_score >= 0.7: lead_label = "High"
-            elif lead_score >= 0.45: lead_label = "Medium"
-            else: lead_label = "Low"
+            lead_score, lead_label = predict_lead(ml_model, text, scorer=batched_scorer(ml_model))
         except Exception as e:
             print(f"ML Prediction failed: {e}")
             lead_score = 0.0
@@ -366,14 +577,18 @@ def submit_lead(current_user):
     )
     
     db.session.add(new_entry)
-    db.session.add(ActivityLog(user_id=current_user.id, action='lead_submit', details=f'Lead {new_entry.id} submitted (Score: {lead_score})'))
+    db.session.flush()
+    rollups.record_feedback([new_entry])
     db.session.commit()
+    dashboard_cache.bump()
+    audit_log.record(current_user.id, 'lead_submit', f'Lead {new_entry.id} submitted (Score: {lead_score})')
     
     return jsonify({
         'message': 'Lead submitted',
         'ml_result': {
             'score': lead_score,
-            'label': lead_label
+            'label': lead_label,
+            'model_version': ml_version
         }
     }), 201
 
@@ -388,42 +603,70 @@ def analyze_feedback(current_user):
     if not text:
         return jsonify({'error': 'Feedback text is required'}), 400
 
-    # --- NEW SENTIMENT MODEL LOGIC ---
-    blob = TextBlob(text)
-    sentiment_score = blob.sentiment.polarity  # Score from -1.0 to 1.0
-    
-    if sentiment_score > 0.2: sentiment_label = "Positive"
-    elif sentiment_score < -0.1: sentiment_label = "Negative"
-    else: sentiment_label = "Neutral"
+    # --- SENTIMENT (shared lexicon scorer + cache) ---
+    polarity, _ = SENTIMENT.score(text)  # Score from -1.0 to 1.0
+    label = sentiment_label(polarity)
     # -----------------------
 
     # Save to the specific SENTIMENT columns
     new_entry = Feedback(
         salesperson_id=current_user.id,
         text=text,
-        sentiment_score=sentiment_score, # <-- Saves to sentiment column
-        sentiment_label=sentiment_label, # <-- Saves to sentiment column
+        sentiment_score=polarity,        # <-- Saves to sentiment column
+        sentiment_label=label,           # <-- Saves to sentiment column
         status='feedback'                # <-- Set a status
     )
     
     db.session.add(new_entry)
-    db.session.add(ActivityLog(user_id=current_user.id, action='feedback_submit', details=f'Feedback {new_entry.id} submitted (Sentiment: {sentiment_label})'))
+    db.session.flush()
+    rollups.record_feedback([new_entry])
     db.session.commit()
+    dashboard_cache.bump()
+    audit_log.record(current_user.id, 'feedback_submit', f'Feedback {new_entry.id} submitted (Sentiment: {label})')
     
     # Return the new sentiment result
     return jsonify({
         'message': 'Feedback submitted',
         'sentiment_result': {
-            'score': sentiment_score,
-            'label': sentiment_label
+            'score': polarity,
+            'label': label
         }
     }), 201
 
+@app.route('/api/analyze-feedback/batch', methods=['POST'])
+@token_required
+@role_required('salesperson')
+def analyze_feedback_batch(current_user):
+    texts, error = read_batch_texts(request.get_json())
+    if error: return error
+
+    # One pass over the batch; repeated texts are scored once
+    scores = [polarity for polarity, _ in SENTIMENT.score_many(texts)]
+    entries = [
+        Feedback(salesperson_id=current_user.id, text=text, sentiment_score=score,
+                 sentiment_label=sentiment_label(score), status='feedback')
+        for text, score in zip(texts, scores)
+    ]
+
+    # All rows land in a single transaction
+    db.session.add_all(entries)
+    db.session.flush()
+    rollups.record_feedback(entries)
+    db.session.commit()
+    dashboard_cache.bump()
+    audit_log.record(current_user.id, 'feedback_submit', f'{len(entries)} feedback entries submitted in batch')
+
+    return jsonify({
+        'message': f'{len(entries)} feedback entries submitted',
+        'results': [{'id': e.id, 'score': e.sentiment_score, 'label': e.sentiment_label} for e in entries]
+    }), 201
+
 # (You can keep your /api/predict-lead and /api/check-grammar routes as they were)
 # ========== API: CHATBOT ==========
 @app.route('/api/chat', methods=['POST'])
 @token_required
 def chat(current_user):
+    chat_model = get_chat_model()
     if not chat_model: return jsonify({'error': 'Chatbot not configured'}), 503
     data = request.get_json()
     msg, context = data.get('message'), data.get('context', '')
@@ -459,8 +702,8 @@ def add_product(current_user):
         catalogue_info=data.get('catalogue_info', '')
     )
     db.session.add(product)
-    db.session.add(ActivityLog(user_id=current_user.id, action='product_add', details=f'Added product: {product.name}'))
     db.session.commit()
+    audit_log.record(current_user.id, 'product_add', f'Added product: {product.name}')
     return jsonify({'message': 'Product added', 'product': product.to_dict()}), 201
 
 @app.route('/api/products/<int:product_id>', methods=['DELETE'])
@@ -470,8 +713,8 @@ def delete_product(current_user, product_id):
     product = Product.query.get_or_404(product_id)
     product_name = product.name
     db.session.delete(product)
-    db.session.add(ActivityLog(user_id=current_user.id, action='product_delete', details=f'Deleted product: {product_name}'))
     db.session.commit()
+    audit_log.record(current_user.id, 'product_delete', f'Deleted product: {product_name}')
     return jsonify({'message': 'Product deleted'}), 200
 
 
@@ -482,14 +725,143 @@ def predict_lead_standalone(current_user):
     data = request.get_json()
     text = data.get('text')
     if not text: return jsonify({'error': 'No text provided'}), 400
+    ml_model, ml_version = get_lead_model()
+    if not ml_model: return jsonify({'error': 'ML model not loaded'}), 503
+
+    try:
+        score, label = predict_lead(ml_model, text, scorer=batched_scorer(ml_model))
+        return jsonify({'score': score, 'label': label, 'model_version': ml_version}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def read_batch_texts(data):
+    """Validate a {"texts": [...]} body. Returns (texts, error_response)."""
+    texts = data.get('texts') if isinstance(data, dict) else None
+    if not isinstance(texts, list) or not texts:
+        return None, (jsonify({'error': 'texts must be a non-empty list'}), 400)
+    if len(texts) > MAX_BATCH_SIZE:
+        return None, (jsonify({'error': f'At most {MAX_BATCH_SIZE} texts per batch'}), 400)
+    for i, t in enumerate(texts):
+        if not isinstance(t, str) or not t.strip():
+            return None, (jsonify({'error': f'Item {i} has no text'}), 400)
+    return texts, None
+
+@app.route('/api/predict-lead/batch', methods=['POST'])
+@token_required
+def predict_lead_batch(current_user):
+    texts, error = read_batch_texts(request.get_json())
+    if error: return error
+    ml_model, ml_version = get_lead_model()
     if not ml_model: return jsonify({'error': 'ML model not loaded'}), 503
 
     try:
-        score = predict_probability(ml_model, text)
-        label = "High" if score >= 0.7 else ("Medium" if score >= 0.45 else "Low")
-        return jsonify({'score': score, 'label': label}), 200
+        results = predict_leads(ml_model, texts)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    return jsonify({
+        'model_version': ml_version,
+        'results': [{'score': score, 'label': label} for score, label in results]
+    }), 200
+
+@app.route('/api/submit-lead/batch', methods=['POST'])
+@token_required
+@role_required('salesperson')
+def submit_lead_batch(current_user):
+    texts, error = read_batch_texts(request.get_json())
+    if error: return error
+
+    # --- ML SCORING (one vectorized call for the whole batch) ---
+    scores, labels = [None] * len(texts), [None] * len(texts)
+    ml_model, ml_version = get_lead_model()
+    if ml_model:
+        try:
+            scores, labels = map(list, zip(*predict_leads(ml_model, texts)))
+        except Exception as e:
+            print(f"ML Prediction failed: {e}")
+            scores, labels = [0.0] * len(texts), ["Error"] * len(texts)
+
+    entries = [
+        Feedback(salesperson_id=current_user.id, text=text, lead_score=score, lead_label=label, status='lead')
+        for text, score, label in zip(texts, scores, labels)
+    ]
+
+    # All rows land in a single transaction
+    db.session.add_all(entries)
+    db.session.flush()
+    rollups.record_feedback(entries)
+    db.session.commit()
+    dashboard_cache.bump()
+    audit_log.record(current_user.id, 'lead_submit', f'{len(entries)} leads submitted in batch')
+
+    return jsonify({
+        'message': f'{len(entries)} leads submitted',
+        'model_version': ml_version,
+        'results': [{'id': e.id, 'score': e.lead_score, 'label': e.lead_label} for e in entries]
+    }), 201
+
+@app.route('/api/import-leads', methods=['POST'])
+@token_required
+@role_required('salesperson')
+def import_leads_csv(current_user):
+    """
+    Bulk lead import. The body is the CSV itself (Content-Type: text/csv), with
+    a text (or note_text) column and an optional timestamp column; it is parsed
+    straight off the request stream. Streams NDJSON events: one per skipped
+    row, progress after each batch of IMPORT_BATCH_SIZE rows, then "done".
+    """
+    if request.mimetype != 'text/csv':
+        # Multipart uploads are spooled whole and closed before a streamed response runs
+        return jsonify({'error': 'Send the CSV as the request body with Content-Type: text/csv'}), 415
+    try:
+        reader, text_index, timestamp_index = lead_import.open_csv(request.stream)
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'error': f'Invalid CSV: {e}'}), 400
+    score_leads, ml_version = import_scorer()
+
+    def events():
+        rows = lead_import.parse_rows(reader, text_index, timestamp_index)
+        for event in lead_import.import_leads(rows, current_user.id, score_leads, IMPORT_BATCH_SIZE):
+            if event['event'] == 'progress':
+                dashboard_cache.bump()
+            elif event['event'] == 'done':
+                event['model_version'] = ml_version
+                audit_log.record(current_user.id, 'lead_import',
+                                 f"{event['imported']} leads imported from CSV ({event['failed']} rows failed)")
+            yield json.dumps(event) + '\n'
+
+    return app.response_class(stream_with_context(events()), mimetype='application/x-ndjson')
+
+@app.route('/api/ml/status', methods=['GET'])
+@token_required
+def ml_status(current_user):
+    if not ml_registry: return jsonify({'error': 'ML module not available'}), 503
+    return jsonify(ml_registry.status()), 200
+
+@app.route('/api/ml/reload', methods=['POST'])
+@token_required
+@role_required('dev')
+def ml_reload(current_user):
+    if not ml_registry: return jsonify({'error': 'ML module not available'}), 503
+    swapped = ml_registry.reload(force=True)
+    return jsonify({'reloaded': swapped, 'status': ml_registry.status()}), 200 if swapped else 409
+
+@app.route('/api/startup-report', methods=['GET'])
+@token_required
+@role_required('dev')
+def startup_report(current_user):
+    return jsonify(startup.to_dict()), 200
+
+@app.route('/api/ml/stats', methods=['GET'])
+@token_required
+@role_required('dev')
+def ml_stats(current_user):
+    if not PREDICTION_CACHE: return jsonify({'error': 'ML module not available'}), 503
+    return jsonify({
+        'prediction_cache': PREDICTION_CACHE.stats(),
+        'lemma_cache': LEMMA_CACHE.stats(),
+        'micro_batcher': lead_batcher.stats(),
+        'sentiment_cache': SENTIMENT.cache.stats(),
+    }), 200
 
 @app.route('/api/check-grammar', methods=['POST'])
 @token_required
@@ -516,89 +888,244 @@ def check_grammar(current_user):
 
 # ========== API ROUTES - Dashboard ==========
 
-@app.route('/api/dashboard', methods=['GET'])
-@token_required
-@role_required('manager')
-def get_dashboard(current_user):
-    
-    # --- General Stats ---
-    total_feedbacks = Feedback.query.count()
-    week_ago = datetime.utcnow() - timedelta(days=7)
-    week_feedbacks = Feedback.query.filter(Feedback.timestamp >= week_ago).count()
+def build_dashboard():
+    """The manager dashboard payload; counts and trends read daily_rollups only."""
+    today = datetime.utcnow().date()
+
+    # --- Lead + sentiment label counts (all history) ---
+    counts = rollups.label_counts()
+    leads, sentiment = counts['leads'], counts['sentiment']
+
+    # --- Last 7 calendar days; the week total is their sum ---
+    per_day = rollups.daily_counts(today - timedelta(days=6), today)
+    trends_labels = [day.strftime('%m/%d') for day in per_day]
+    trends_data = list(per_day.values())
+
     active_sales = User.query.filter_by(role='salesperson').count()
-    
-    # --- LEAD STATS (For Lead Chart) ---
-    high_leads = Feedback.query.filter(Feedback.lead_label == 'High').count()
-    medium_leads = Feedback.query.filter(Feedback.lead_label == 'Medium').count()
-    low_leads = Feedback.query.filter(Feedback.lead_label == 'Low').count()
-
-    # --- SENTIMENT STATS (For Sentiment Chart) ---
-    pos_count = Feedback.query.filter(Feedback.sentiment_label == 'Positive').count()
-    neg_count = Feedback.query.filter(Feedback.sentiment_label == 'Negative').count()
-    neu_count = Feedback.query.filter(Feedback.sentiment_label == 'Neutral').count()
-
-    # --- Wordcloud (from high-quality LEADS) ---
-    high_quality_texts = [f.text for f in Feedback.query.filter(Feedback.lead_label == 'High').all()]
-    source_text = ' '.join(high_quality_texts) if len(high_quality_texts) > 5 else ' '.join([f.text for f in Feedback.query.filter(Feedback.lead_label != None).all()])
-    words = re.findall(r'\w+', source_text.lower())
-    stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'is', 'was', 'are', 'were', 'of', 'with', 'it', 'this', 'that', 'we', 'i', 'they'}
-    word_counts = Counter(w for w in words if w not in stop_words and len(w) > 2)
-    wordcloud_data = [[word, count] for word, count in word_counts.most_common(50)]
-    
-    # --- Trends Chart (for ALL entries) ---
-    trends_labels = []
-    trends_data = []
-    for i in range(6, -1, -1):
-        day = datetime.utcnow() - timedelta(days=i)
-        day_start = day.replace(hour=0, minute=0, second=0, microsecond=0)
-        day_end = day_start + timedelta(days=1)
-        count = Feedback.query.filter(Feedback.timestamp >= day_start, Feedback.timestamp < day_end).count()
-        trends_labels.append(day.strftime('%m/%d'))
-        trends_data.append(count)
-    
-    # --- Recent Entries (for ALL entries) ---
-    recent = Feedback.query.order_by(Feedback.timestamp.desc()).limit(10).all()
-    
-    return jsonify({
+
+    # --- Wordcloud (from high-quality LEADS, or every lead while there are few) ---
+    wordcloud_data = rollups.top_terms('High' if leads['High'] > 5 else None)
+
+    # --- Recent Entries (salesperson joined in, not lazy-loaded per row) ---
+    recent = Feedback.query.options(joinedload(Feedback.salesperson)) \
+        .order_by(Feedback.timestamp.desc()).limit(10).all()
+
+    return {
         'stats': {
-            'total': total_feedbacks,
-            'week': week_feedbacks,
+            'total': counts['total'],
+            'week': sum(trends_data),
             'active_sales': active_sales,
-            'leads': {'high': high_leads, 'medium': medium_leads, 'low': low_leads}
+            'leads': {'high': leads['High'], 'medium': leads['Medium'], 'low': leads['Low']}
         },
-        'sentiment': {'positive': pos_count, 'neutral': neu_count, 'negative': neg_count},
+        'sentiment': {'positive': sentiment['Positive'], 'neutral': sentiment['Neutral'], 'negative': sentiment['Negative']},
         'wordcloud_data': wordcloud_data,
         'trends': {'labels': trends_labels, 'data': trends_data},
         'recent': [f.to_dict() for f in recent],
+    }
+
+@app.route('/api/dashboard', methods=['GET'])
+@token_required
+@role_required('manager')
+def get_dashboard(current_user):
+    # Every open manager tab polls this; they share one build per write version
+    body = dashboard_cache.get(lambda: app.json.dumps(build_dashboard()).encode('utf-8'))
+    return app.response_class(body, mimetype='application/json'), 200
+
+@app.route('/api/stats', methods=['GET'])
+@token_required
+@role_required('manager')
+def get_stats(current_user):
+    """Counts, label distributions and a per-day series for ?from=&to= (YYYY-MM-DD), from rollups only."""
+    today = datetime.utcnow().date()
+    try:
+        end = rollups.parse_day(request.args.get('to'), today)
+        start = rollups.parse_day(request.args.get('from'), end - timedelta(days=6))
+    except ValueError:
+        return jsonify({'error': 'from/to must be YYYY-MM-DD'}), 400
+    if start > end:
+        return jsonify({'error': 'from must not be after to'}), 400
+    if (end - start).days > 3660:
+        return jsonify({'error': 'Date range too large (max 10 years)'}), 400
+    salesperson_id = request.args.get('salesperson_id', type=int)
+
+    per_day = rollups.daily_counts(start, end, salesperson_id)
+    return jsonify({
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'salesperson_id': salesperson_id,
+        **rollups.label_counts(start, end, salesperson_id),
+        'daily': {'labels': [d.isoformat() for d in per_day], 'data': list(per_day.values())},
     }), 200
 
+@app.route('/api/wordcloud', methods=['GET'])
+@token_required
+@role_required('manager')
+def get_wordcloud(current_user):
+    """Top terms from the term index; optional ?label=, ?from=&to= (YYYY-MM-DD), ?salesperson_id=."""
+    try:
+        start = rollups.parse_day(request.args.get('from'))
+        end = rollups.parse_day(request.args.get('to'))
+    except ValueError:
+        return jsonify({'error': 'from/to must be YYYY-MM-DD'}), 400
+    label = request.args.get('label') or None
+    if label is not None and label not in rollups.LEAD_LABELS:
+        return jsonify({'error': f'label must be one of {list(rollups.LEAD_LABELS)}'}), 400
+    limit = min(request.args.get('limit', 50, type=int), 200)
+    terms = rollups.top_terms(label, start, end, request.args.get('salesperson_id', type=int), limit)
+    return jsonify({'wordcloud_data': terms}), 200
+
+
+REPORT_HEADER = ['ID', 'Salesperson', 'Feedback', 'Time', 'Status', 'Lead Score', 'Lead Label']
+REPORT_CHUNK_ROWS = 1000
+
+def filter_feedback(query, args):
+    """Apply ?from=&to= (YYYY-MM-DD), status, salesperson_id, label and sentiment filters. ValueError on bad input."""
+    start, end = rollups.parse_day(args.get('from')), rollups.parse_day(args.get('to'))
+    if start: query = query.filter(Feedback.timestamp >= datetime.combine(start, datetime.min.time()))
+    if end: query = query.filter(Feedback.timestamp < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+    if args.get('status'): query = query.filter(Feedback.status == args['status'])
+    if args.get('salesperson_id'): query = query.filter(Feedback.salesperson_id == int(args['salesperson_id']))
+    if args.get('label'): query = query.filter(Feedback.lead_label == args['label'])
+    if args.get('sentiment'): query = query.filter(Feedback.sentiment_label == args['sentiment'])
+    return query
+
+def report_query(args):
+    """Report rows (salesperson joined, no ORM objects) for the request's filters."""
+    query = db.session.query(
+        Feedback.id, User.username, Feedback.text, Feedback.timestamp,
+        Feedback.status, Feedback.lead_score, Feedback.lead_label,
+    ).join(User, Feedback.salesperson_id == User.id)
+    return filter_feedback(query, args).order_by(Feedback.timestamp.desc(), Feedback.id.desc())
+
+def report_chunks(query):
+    """CSV bytes, REPORT_CHUNK_ROWS rows at a time; only one chunk is ever held in memory."""
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    # 'utf-8-sig' BOM up front for Excel compatibility
+    yield '\ufeff'.encode('utf-8')
+    w.writerow(REPORT_HEADER)
+    for i, (fid, username, text, timestamp, status, lead_score, lead_label) in enumerate(
+            query.execution_options(yield_per=REPORT_CHUNK_ROWS), 1):
+        w.writerow([
+            fid,
+            username,
+            text,
+            timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+            status,
+            f"{lead_score:.2f}" if lead_score is not None else "N/A",
+            lead_label or "N/A"
+        ])
+        if i % REPORT_CHUNK_ROWS == 0:
+            yield buf.getvalue().encode('utf-8')
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode('utf-8')
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out: yield out
+    yield compressor.flush()
 
 @app.route('/api/download-report', methods=['GET'])
 @token_required
 @role_required('manager')
 def download_report(current_user):
-    out = io.StringIO()
-    w = csv.writer(out)
-    w.writerow(['ID', 'Salesperson', 'Feedback', 'Time', 'Status', 'Lead Score', 'Lead Label'])
-    for f in Feedback.query.order_by(Feedback.timestamp.desc()).all():
-        w.writerow([
-            f.id, 
-            f.salesperson.username, 
-            f.text, 
-            f.timestamp.strftime('%Y-%m-%d %H:%M:%S'), 
-            f.status, 
-            f"{f.lead_score:.2f}" if f.lead_score is not None else "N/A", 
-            f.lead_label or "N/A"
-        ])
-    out.seek(0)
-    # CRITICAL FIX: 'utf-8-sig' adds the BOM for Excel compatibility
-    return send_file(
-        io.BytesIO(out.getvalue().encode('utf-8-sig')), 
-        mimetype='text/csv', 
-        as_attachment=True, 
-        download_name=f'sales_report_{datetime.utcnow().strftime("%Y-%m-%d")}.csv'
+    """
+    Streams the CSV report. Filters: ?from=&to= (YYYY-MM-DD), ?status=,
+    ?salesperson_id=, ?label= (lead), ?sentiment=; ?gzip=1 for a .csv.gz.
+    """
+    try:
+        query = report_query(request.args)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid filter: {e}'}), 400
+
+    body = report_chunks(query)
+    filename = f'sales_report_{datetime.utcnow().strftime("%Y-%m-%d")}.csv'
+    mimetype = 'text/csv'
+    if request.args.get('gzip') == '1':
+        body, filename, mimetype = gzip_chunks(body), filename + '.gz', 'application/gzip'
+
+    return app.response_class(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'},
     )
 
+# ========== API ROUTES - Feedback listing ==========
+FEEDBACK_PAGE_DEFAULT = 50
+FEEDBACK_PAGE_MAX = 200
+
+def encode_cursor(timestamp, fid):
+    return base64.urlsafe_b64encode(json.dumps([timestamp.isoformat(), fid]).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """(timestamp, id) from an opaque cursor; ValueError if it was tampered with."""
+    try:
+        ts, fid = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return datetime.fromisoformat(ts), int(fid)
+    except Exception:
+        raise ValueError('invalid cursor')
+
+def feedback_page_query(args, after=None):
+    """Newest-first (timestamp, id) keyset page: seeks past the cursor instead of OFFSET."""
+    query = filter_feedback(
+        db.session.query(Feedback, User.username).join(User, Feedback.salesperson_id == User.id), args)
+    if after is not None:
+        query = query.filter(tuple_(Feedback.timestamp, Feedback.id) < after)
+    return query.order_by(Feedback.timestamp.desc(), Feedback.id.desc())
+
+@app.route('/api/feedback', methods=['GET'])
+@token_required
+def list_feedback(current_user):
+    """
+    ?limit= (max 200), ?cursor= (next_cursor of the previous page) and the
+    report filters. Salespeople only ever see their own entries.
+    """
+    args = request.args.copy()
+    if current_user.role == 'salesperson':
+        args['salesperson_id'] = str(current_user.id)
+    limit = max(1, min(request.args.get('limit', FEEDBACK_PAGE_DEFAULT, type=int), FEEDBACK_PAGE_MAX))
+    try:
+        after = decode_cursor(args['cursor']) if args.get('cursor') else None
+        rows = feedback_page_query(args, after).limit(limit + 1).all()
+    except ValueError as e:
+        return jsonify({'error': f'Invalid filter: {e}'}), 400
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    last = rows[-1][0] if rows else None
+    return jsonify({
+        'items': [f.to_dict(username) for f, username in rows],
+        'next_cursor': encode_cursor(last.timestamp, last.id) if has_more else None,
+    }), 200
+
+OUTCOMES = {'won': 1, 'lost': 0, 1: 1, 0: 0}
+
+@app.route('/api/feedback/<int:feedback_id>/outcome', methods=['POST'])
+@token_required
+@role_required('salesperson', 'manager')
+def set_outcome(current_user, feedback_id):
+    """{"outcome": "won" | "lost" | null}. Labels the lead for the next update-lead-model run."""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or 'outcome' not in data:
+        return jsonify({'error': 'outcome is required'}), 400
+    outcome = data['outcome']
+    if outcome is not None:
+        if isinstance(outcome, bool) or not isinstance(outcome, (str, int)) or outcome not in OUTCOMES:
+            return jsonify({'error': 'outcome must be "won", "lost" or null'}), 400
+        outcome = OUTCOMES[outcome]
+
+    entry = db.session.get(Feedback, feedback_id)
+    if not entry or (current_user.role == 'salesperson' and entry.salesperson_id != current_user.id):
+        return jsonify({'error': 'Feedback not found'}), 404
+    entry.outcome = outcome
+    entry.outcome_at = datetime.utcnow()
+    db.session.commit()
+    audit_log.record(current_user.id, 'lead_outcome', f'Lead {feedback_id} outcome set to {data["outcome"]}')
+    return jsonify({'message': 'Outcome recorded', 'feedback': entry.to_dict()}), 200
+
 # ========== API ROUTES - Dev Management ==========
 
 @app.route('/api/users', methods=['GET'])
@@ -616,13 +1143,15 @@ def add_user(current_user):
     if User.query.filter_by(username=data.get('username')).first():
         return jsonify({'error': 'Username already exists'}), 400
     
-    user = User(username=data.get('username'), role=data.get('role'))
-    user.set_password(data.get('password'))
+    try:
+        user = User(username=data.get('username'), role=data.get('role'),
+                    password_hash=password_pool.hash(data.get('password')))
+    except PasswordPoolBusy:
+        return password_busy()
     db.session.add(user)
     db.session.commit()
-    
-    db.session.add(ActivityLog(user_id=current_user.id, action='user_add', details=f'Added user: {user.username} ({user.role})'))
-    db.session.commit()
+    dashboard_cache.bump()
+    audit_log.record(current_user.id, 'user_add', f'Added user: {user.username} ({user.role})')
     return jsonify({'message': 'User added', 'user': user.to_dict()}), 201
 
 @app.route('/api/users/<int:user_id>', methods=['DELETE'])
@@ -635,18 +1164,40 @@ def delete_user(current_user, user_id):
     user = User.query.get_or_404(user_id)
     username = user.username
     db.session.delete(user)
+    rollups.forget_salesperson(user_id)
     db.session.commit()
-    
-    db.session.add(ActivityLog(user_id=current_user.id, action='user_delete', details=f'Deleted user: {username}'))
-    db.session.commit()
+    principal_cache.invalidate(user_id)
+    dashboard_cache.bump()
+    audit_log.record(current_user.id, 'user_delete', f'Deleted user: {username}')
     return jsonify({'message': 'User deleted'}), 200
 
 @app.route('/api/logs', methods=['GET'])
 @token_required
 @role_required('dev')
 def get_logs(current_user):
-    logs = ActivityLog.query.order_by(ActivityLog.timestamp.desc()).limit(100).all()
-    return jsonify({'logs': [l.to_dict() for l in logs]}), 200
+    audit_log.flush()  # include this worker's queued entries
+    logs = db.session.query(ActivityLog, User.username).join(User, ActivityLog.user_id == User.id) \
+        .order_by(ActivityLog.timestamp.desc()).limit(100).all()
+    return jsonify({'logs': [l.to_dict(username) for l, username in logs]}), 200
+
+@app.route('/api/logs/stats', methods=['GET'])
+@token_required
+@role_required('dev')
+def get_log_stats(current_user):
+    return jsonify(audit_log.stats()), 200
+
+@app.route('/api/auth/stats', methods=['GET'])
+@token_required
+@role_required('dev')
+def auth_stats(current_user):
+    return jsonify({
+        'password_pool': password_pool.stats(),
+        'principal_cache': principal_cache.stats(),
+    }), 200
+
+
+startup.mark('routes')
+startup.log()
 
 
 if __name__ == '__main__':
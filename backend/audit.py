@@ -0,0 +1,113 @@
+import atexit
+import queue
+import threading
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from models import db, ActivityLog
+
+
+class AuditLog:
+    """
+    Write-behind sink for ActivityLog rows.
+
+    record() stamps the entry and puts it on a bounded queue without touching
+    the database, so audit logging stays off the request's transaction and
+    out of SQLite's write lock. A daemon thread bulk-inserts up to batch_size
+    entries at a time, at least every flush_interval seconds. When the queue
+    is full the entry is dropped and counted. flush() drains synchronously;
+    it runs at interpreter exit and before /api/logs reads the table.
+    """
+
+    def __init__(self, app, maxsize=10000, batch_size=200, flush_interval=1.0, background=True):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.background = background
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._wake = threading.Event()
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        atexit.register(self.flush)
+
+    def record(self, user_id, action, details=None):
+        entry = {'user_id': user_id, 'action': action, 'details': details, 'timestamp': datetime.utcnow()}
+        if not self.background:
+            self._write([entry])
+            return
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+            return
+        self._ensure_thread()
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+
+    def _ensure_thread(self):
+        # Started on first use, after gunicorn has forked the worker
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="audit-log", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            # Wakes early once a full batch is waiting
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"AUDIT: flush failed: {e}")
+
+    def flush(self):
+        """Write everything queued so far; waits for a write already in progress."""
+        with self._write_lock:
+            while True:
+                batch = []
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    return
+                self._write(batch)
+
+    def _write(self, batch):
+        with self.app.app_context():
+            try:
+                db.session.execute(insert(ActivityLog), batch)
+                db.session.commit()
+                self.written += len(batch)
+                self.batches += 1
+                return
+            except Exception as e:
+                db.session.rollback()
+                print(f"AUDIT: batch of {len(batch)} failed ({e}); retrying row by row")
+            # One bad row (e.g. a user deleted meanwhile) must not lose the rest
+            for entry in batch:
+                try:
+                    db.session.execute(insert(ActivityLog), [entry])
+                    db.session.commit()
+                    self.written += 1
+                except Exception:
+                    db.session.rollback()
+                    self.failed += 1
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'maxsize': self._queue.maxsize,
+            'written': self.written,
+            'batches': self.batches,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'batch_size': self.batch_size,
+            'flush_interval': self.flush_interval,
+        }
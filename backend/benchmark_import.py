@@ -0,0 +1,97 @@
+# benchmark_import.py
+"""
+Bulk CSV lead import vs. the one-note-per-request path.
+
+Usage:
+  python backend/benchmark_import.py --rows 20000 --single-rows 500
+  python backend/benchmark_import.py --rows 50000 --batch-size 1000
+
+Builds a CSV of --rows unique notes (the training notes, numbered), posts
+--single-rows of them one at a time to /api/submit-lead, then uploads the
+whole file to /api/import-leads, all through the Flask test client against a
+throwaway SQLite database. Prints rows/sec for both and the import's peak
+traced Python memory. The import also scores sentiment, which submit-lead
+does not. Nothing outside a temp dir is written.
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+from time import perf_counter
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BACKEND_DIR)
+DATA_PATH = os.path.join(os.path.dirname(BACKEND_DIR), 'data', 'clean_sales_data.csv')
+
+
+def load_notes():
+    with open(DATA_PATH, newline='', encoding='utf-8') as fh:
+        return [row['note_text'] for row in csv.DictReader(fh)]
+
+
+def make_csv(path, notes, n):
+    with open(path, 'w', newline='', encoding='utf-8') as fh:
+        w = csv.writer(fh)
+        w.writerow(['note_text'])
+        for i in range(n):
+            w.writerow([f"{notes[i % len(notes)]} (#{i})"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--single-rows', type=int, default=500)
+    parser.add_argument('--batch-size', type=int, default=int(os.environ.get('IMPORT_BATCH_SIZE', 500)))
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='import-bench-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ['IMPORT_BATCH_SIZE'] = str(args.batch_size)
+    import app as backend
+    from models import db, User
+
+    with backend.app.app_context():
+        backend.migrations.upgrade()
+        user = User(username='bench', role='salesperson')
+        user.set_password('bench')
+        db.session.add(user)
+        db.session.commit()
+        backend.get_lead_model()
+
+    client = backend.app.test_client()
+    token = client.post('/api/login', json={'username': 'bench', 'password': 'bench', 'role': 'salesperson'}).get_json()['token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    path = os.path.join(tmp, 'leads.csv')
+    notes = load_notes()
+    make_csv(path, notes, args.rows)
+    singles = [f"{notes[i % len(notes)]} [single #{i}]" for i in range(args.single_rows)]
+
+    t0 = perf_counter()
+    for text in singles:
+        client.post('/api/submit-lead', json={'text': text}, headers=headers)
+    single_rate = len(singles) / (perf_counter() - t0)
+
+    tracemalloc.start()
+    t0 = perf_counter()
+    with open(path, 'rb') as fh:
+        response = client.post('/api/import-leads', data=fh, headers=headers, content_type='text/csv')
+        events = [json.loads(line) for line in io.StringIO(response.get_data(as_text=True))]
+    elapsed = perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    done = events[-1]
+
+    print(f"{'path':<28} {'rows':>7} {'rows/s':>9}")
+    print(f"{'/api/submit-lead (1/req)':<28} {len(singles):>7} {single_rate:>9.1f}")
+    print(f"{f'/api/import-leads (b={args.batch_size})':<28} {done['imported']:>7} {done['imported'] / elapsed:>9.1f}"
+          f"   x{done['imported'] / elapsed / single_rate:.0f}, peak traced memory {peak / 2 ** 20:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
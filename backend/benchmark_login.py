@@ -0,0 +1,124 @@
+# benchmark_login.py
+"""
+Login throughput and worker availability under a burst of logins.
+
+Usage:
+  python backend/benchmark_login.py --threads 16 --seconds 10
+  PASSWORD_HASH_METHOD=scrypt:16384:8:1 python backend/benchmark_login.py --workers 2 --max-pending 8
+
+Runs /api/login through the Flask test client from --threads concurrent
+clients against a throwaway SQLite database, once with the KDF inline on the
+request thread (the old path) and once through the password pool. While the
+burst runs a probe thread fetches a cheap page every 50 ms; its latency shows
+whether the rest of the app still gets served. Nothing outside a temp dir is
+written.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+from time import perf_counter, sleep
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from passwords import PasswordPool, hash_password  # noqa: E402
+
+backend = None  # app module, imported in main() once DATABASE_URL points at the temp dir
+
+
+def summarize(ms):
+    if not ms:
+        return "      n/a"
+    ms = sorted(ms)
+    p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+    return f"median {statistics.median(ms):7.1f} ms | p95 {p95:7.1f} ms"
+
+
+def create_users(n):
+    from models import db, User
+    with backend.app.app_context():
+        backend.migrations.upgrade()
+        for i in range(n):
+            user = User(username=f'bench{i}', role='salesperson')
+            user.set_password(f'pw{i}')
+            db.session.add(user)
+        db.session.commit()
+
+
+def burst(pool, threads, seconds, users):
+    backend.password_pool = pool
+    client = backend.app.test_client()
+    stop = threading.Event()
+    login_ms, busy_ms, probe_ms = [], [], []
+
+    def login_loop(k):
+        i = k
+        while not stop.is_set():
+            body = {'username': f'bench{i % users}', 'password': f'pw{i % users}', 'role': 'salesperson'}
+            t0 = perf_counter()
+            response = client.post('/api/login', json=body)
+            elapsed = (perf_counter() - t0) * 1000
+            if response.status_code == 200:
+                login_ms.append(elapsed)
+            elif response.status_code == 503:
+                busy_ms.append(elapsed)
+                sleep(float(response.headers.get('Retry-After', 1)))
+            i += threads
+
+    def probe_loop():
+        while not stop.is_set():
+            t0 = perf_counter()
+            client.get('/login')
+            probe_ms.append((perf_counter() - t0) * 1000)
+            sleep(0.05)
+
+    workers = [threading.Thread(target=login_loop, args=(k,)) for k in range(threads)]
+    workers.append(threading.Thread(target=probe_loop))
+    t0 = perf_counter()
+    for t in workers:
+        t.start()
+    sleep(seconds)
+    stop.set()
+    for t in workers:
+        t.join()
+    elapsed = perf_counter() - t0
+    return {'elapsed': elapsed, 'login_ms': login_ms, 'busy_ms': busy_ms, 'probe_ms': probe_ms}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16, help='concurrent login clients')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--users', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('PASSWORD_WORKERS', 1)))
+    parser.add_argument('--max-pending', type=int, default=int(os.environ.get('PASSWORD_MAX_PENDING', 4)))
+    args = parser.parse_args()
+
+    # Pool processes re-import this module as __mp_main__, so the app is only loaded here
+    global backend
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='login-bench-'), 'bench.db')}"
+    import app as backend
+
+    create_users(args.users)
+    warmup = hash_password('x')
+    cores = os.cpu_count() or 1
+    configs = [
+        ('inline (before)', PasswordPool(workers=0, max_pending=10 ** 9)),
+        (f'pool w={args.workers} q={args.max_pending}', PasswordPool(workers=args.workers, max_pending=args.max_pending)),
+    ]
+    print(f"hash {configs[1][1].stats()['method']} | {args.threads} clients | {args.seconds:.0f}s | {cores} core(s)")
+    for name, pool in configs:
+        pool.verify(warmup, 'x')  # start the pool processes outside the timed run
+        r = burst(pool, args.threads, args.seconds, args.users)
+        rate = len(r['login_ms']) / r['elapsed']
+        print(f"{name:<22} {rate:6.1f} logins/s ({rate / cores:6.1f}/core) | 503s {len(r['busy_ms']):5d}")
+        print(f"{'':<22} login  {summarize(r['login_ms'])}")
+        print(f"{'':<22} 503    {summarize(r['busy_ms'])}")
+        print(f"{'':<22} probe  {summarize(r['probe_ms'])}")
+
+
+if __name__ == '__main__':
+    main()
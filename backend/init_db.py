@@ -1,12 +1,15 @@
 from app import app, db
 from models import User, Product, Feedback  # Added Feedback to imports
 from datetime import datetime, timedelta
+import rollups
+import migrations
 
 def init_database():
     with app.app_context():
         # Drop all tables and recreate
         db.drop_all()
-        db.create_all()
+        db.session.execute(db.text('DROP TABLE IF EXISTS schema_migrations'))
+        migrations.upgrade()
         
         # Create default users
         print("Creating default users...")
@@ -66,6 +69,8 @@ def init_database():
             )
         ]
         for f in feedbacks: db.session.add(f)
+        db.session.flush()
+        rollups.record_feedback(feedbacks)
         # --------------------------------------------------
         
         db.session.commit()
@@ -0,0 +1,138 @@
+"""
+Bulk lead import from CRM CSV exports.
+
+The file is read one row at a time and handled batch_size rows at a time:
+one predict call and one sentiment pass per batch, one multi-row INSERT,
+the rollups for those rows, then a commit. Memory is bounded by the batch,
+not the file, and a batch that fails rolls back alone.
+"""
+import csv
+import io
+from datetime import datetime, timezone
+from time import perf_counter
+from types import SimpleNamespace
+
+from sqlalchemy import insert
+
+from models import db, Feedback
+from sentiment import SENTIMENT, sentiment_label
+import rollups
+
+# First matching header wins (case-insensitive)
+TEXT_COLUMNS = ('text', 'note_text', 'note', 'notes')
+TIMESTAMP_COLUMNS = ('timestamp', 'date', 'created_at')
+
+
+def open_csv(stream):
+    """
+    csv.reader over a binary or text stream, positioned after the header.
+    Returns (reader, text_index, timestamp_index or None); ValueError when the
+    header has no text column.
+    """
+    if not isinstance(stream, io.TextIOBase):
+        # utf-8-sig drops the BOM Excel puts on exports
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.reader(stream)
+    header = [h.strip().lower() for h in next(reader, [])]
+
+    def find(names):
+        return next((header.index(n) for n in names if n in header), None)
+
+    text_index = find(TEXT_COLUMNS)
+    if text_index is None:
+        raise ValueError(f"CSV needs one of these columns: {', '.join(TEXT_COLUMNS)}")
+    return reader, text_index, find(TIMESTAMP_COLUMNS)
+
+
+def parse_rows(reader, text_index, timestamp_index=None):
+    """(line, text, timestamp or None, error or None) per CSV row; line is the row's last physical line."""
+    for row in reader:
+        line = reader.line_num
+        if not any(cell.strip() for cell in row):
+            continue  # blank line
+        text = row[text_index].strip() if text_index < len(row) else ''
+        if not text:
+            yield line, None, None, 'empty text'
+            continue
+        timestamp = None
+        if timestamp_index is not None and timestamp_index < len(row) and row[timestamp_index].strip():
+            try:
+                timestamp = datetime.fromisoformat(row[timestamp_index].strip())
+            except ValueError:
+                yield line, None, None, f'bad timestamp {row[timestamp_index]!r}'
+                continue
+            if timestamp.tzinfo is not None:
+                timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)  # stored as naive UTC
+        yield line, text, timestamp, None
+
+
+def import_leads(rows, salesperson_id, score_leads=None, batch_size=500):
+    """
+    Insert parsed rows as lead Feedback for salesperson_id, batch_size at a
+    time. score_leads(texts) -> [(score, label), ...], or None to leave lead
+    columns empty. Yields event dicts:
+      {'event': 'error', 'line', 'error'}      a row that was skipped
+      {'event': 'progress', 'rows', 'imported', 'failed', 'rows_per_sec'}   after each batch
+      {'event': 'done', ...same counters, 'seconds', 'aborted'}
+    'aborted' is None, or why the rest of the file could not be read (bad
+    encoding, broken quoting); rows before that point are still imported.
+    """
+    t0 = perf_counter()
+    counts = {'rows': 0, 'imported': 0, 'failed': 0}
+    aborted = None
+
+    def progress(event):
+        elapsed = perf_counter() - t0
+        return dict(counts, event=event, seconds=round(elapsed, 2),
+                    rows_per_sec=round(counts['rows'] / elapsed, 1) if elapsed else None)
+
+    batch = []
+    try:
+        for line, text, timestamp, error in rows:
+            counts['rows'] += 1
+            if error:
+                counts['failed'] += 1
+                yield {'event': 'error', 'line': line, 'error': error}
+                continue
+            batch.append((line, text, timestamp))
+            if len(batch) >= batch_size:
+                yield from _insert_batch(batch, salesperson_id, score_leads, counts)
+                batch = []
+                yield progress('progress')
+    except (csv.Error, UnicodeDecodeError) as e:
+        aborted = str(e)
+    if batch:
+        yield from _insert_batch(batch, salesperson_id, score_leads, counts)
+        yield progress('progress')
+    yield dict(progress('done'), aborted=aborted)
+
+
+def _insert_batch(batch, salesperson_id, score_leads, counts):
+    texts = [text for _, text, _ in batch]
+    leads = [(None, None)] * len(texts)
+    if score_leads:
+        try:
+            leads = score_leads(texts)
+        except Exception as e:
+            print(f"ML Prediction failed: {e}")
+            leads = [(0.0, "Error")] * len(texts)
+    sentiments = SENTIMENT.score_many(texts, cached=False)
+
+    now = datetime.utcnow()
+    values = [
+        {'salesperson_id': salesperson_id, 'text': text, 'timestamp': timestamp or now, 'status': 'lead',
+         'lead_score': lead_score, 'lead_label': lead_label,
+         'sentiment_score': polarity, 'sentiment_label': sentiment_label(polarity)}
+        for (_, text, timestamp), (lead_score, lead_label), (polarity, _) in zip(batch, leads, sentiments)
+    ]
+    try:
+        db.session.execute(insert(Feedback), values)
+        rollups.record_feedback(SimpleNamespace(**v) for v in values)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        counts['failed'] += len(batch)
+        for line, _, _ in batch:
+            yield {'event': 'error', 'line': line, 'error': f'batch insert failed: {e}'}
+        return
+    counts['imported'] += len(batch)
@@ -0,0 +1,132 @@
+"""
+Incremental updates of the online lead model (code/online_model.py) from
+Feedback rows whose outcome has been recorded.
+
+The checkpoint remembers the (outcome_at, id) of the last row it learned.
+Each run seeks past it on ix_feedbacks_outcome_at and reads batch_size rows
+at a time, one partial_fit per batch, so a run costs time in the new labels
+only. The checkpoint is rewritten once at the end, atomically, and a
+ModelRegistry serving that path picks it up on its next poll. A row whose
+outcome is changed later gets a new outcome_at and is learned again.
+
+train_from_db builds a model from scratch out of every labeled row instead,
+streamed through a server-side cursor with a reservoir-sampled holdout, so
+the labeled history never has to fit in memory.
+"""
+from time import perf_counter
+
+import numpy as np
+from sklearn.metrics import accuracy_score, f1_score
+from sqlalchemy import select, tuple_
+
+from models import db, Feedback
+from data_stream import ReservoirHoldout
+import online_model
+
+
+def labeled_batches(after=None, batch_size=500):
+    """Lists of (id, text, outcome, outcome_at) rows labeled after the (outcome_at, id) watermark."""
+    query = (db.session.query(Feedback.id, Feedback.text, Feedback.outcome, Feedback.outcome_at)
+             .filter(Feedback.outcome.isnot(None), Feedback.outcome_at.isnot(None))
+             .order_by(Feedback.outcome_at, Feedback.id))
+    while True:
+        page = query
+        if after is not None:
+            page = page.filter(tuple_(Feedback.outcome_at, Feedback.id) > after)
+        rows = page.limit(batch_size).all()
+        if not rows:
+            return
+        yield rows
+        after = (rows[-1].outcome_at, rows[-1].id)
+        if len(rows) < batch_size:
+            return
+
+
+def update_model(path, batch_size=500, max_rows=None, reset=False):
+    """
+    Learn the rows labeled since the checkpoint at path (a fresh model if there
+    is none, or reset=True) and save it. Returns a summary dict.
+    """
+    t0 = perf_counter()
+    model = None if reset else online_model.load_checkpoint(path)
+    if model is None:
+        model = online_model.OnlineLeadModel()
+    since = getattr(model, 'watermark_', None)
+
+    rows = batches = 0
+    for batch in labeled_batches(since, batch_size):
+        if max_rows is not None:
+            batch = batch[:max_rows - rows]
+        model.partial_fit([r.text for r in batch], [r.outcome for r in batch])
+        model.watermark_ = (batch[-1].outcome_at, batch[-1].id)
+        rows += len(batch)
+        batches += 1
+        if max_rows is not None and rows >= max_rows:
+            break
+    db.session.rollback()  # read-only; ends the transaction before the checkpoint write
+
+    if rows:
+        online_model.save_checkpoint(model, path)
+    watermark = model.watermark_ if rows else since
+    return {
+        'rows': rows,
+        'batches': batches,
+        'total_seen': getattr(model, 'n_seen_', 0),
+        'since': since[0].isoformat() if since else None,
+        'watermark': watermark[0].isoformat() if watermark else None,
+        'seconds': round(perf_counter() - t0, 2),
+        'saved': bool(rows),
+    }
+
+
+def latest_label():
+    """(outcome_at, id) of the most recently labeled row, or None."""
+    row = (db.session.query(Feedback.outcome_at, Feedback.id)
+           .filter(Feedback.outcome.isnot(None), Feedback.outcome_at.isnot(None))
+           .order_by(Feedback.outcome_at.desc(), Feedback.id.desc()).first())
+    return tuple(row) if row else None
+
+
+def feedback_chunks(until, chunksize=10000):
+    """
+    (texts, labels) arrays of the rows labeled up to the until watermark,
+    chunksize rows at a time. yield_per streams them from a server-side
+    cursor on Postgres (a plain lazily-read cursor on SQLite) instead of
+    fetching the whole result.
+    """
+    stmt = (select(Feedback.text, Feedback.outcome)
+            .where(Feedback.outcome.isnot(None), Feedback.outcome_at.isnot(None),
+                   tuple_(Feedback.outcome_at, Feedback.id) <= until)
+            .order_by(Feedback.outcome_at, Feedback.id)
+            .execution_options(yield_per=chunksize))
+    for rows in db.session.execute(stmt).partitions():
+        yield np.array([r.text for r in rows], dtype=object), np.array([r.outcome for r in rows], dtype=int)
+
+
+def train_from_db(path, epochs=5, holdout=10000, max_fraction=0.2, chunksize=10000, batch_size=1000):
+    """
+    Train a fresh online model on every labeled row (as of the start of the
+    run), evaluate it on the held-out rows and save it; later rows are left
+    for update_model. Returns a summary dict, or None when nothing is labeled.
+    """
+    t0 = perf_counter()
+    until = latest_label()
+    if until is None:
+        return None
+    model = online_model.OnlineLeadModel()
+    split = ReservoirHoldout(size=holdout, max_fraction=max_fraction)
+    X_test, y_test = online_model.train_stream(model, lambda: feedback_chunks(until, chunksize), split,
+                                               epochs=epochs, batch_size=batch_size)
+    db.session.rollback()  # read-only; ends the transaction before the checkpoint write
+    model.watermark_ = until
+
+    metrics = {}
+    if len(y_test):
+        preds = model.predict(X_test)
+        metrics = {'holdout_accuracy': round(accuracy_score(y_test, preds), 4),
+                   'holdout_f1': round(f1_score(y_test, preds, zero_division=0), 4)}
+    online_model.save_checkpoint(model, path)
+    peak = online_model.peak_memory_mb()
+    return dict(metrics, rows=split.seen, trained=split.seen - len(y_test), held_out=len(y_test), epochs=epochs,
+                watermark=until[0].isoformat(), seconds=round(perf_counter() - t0, 2),
+                peak_mb=round(peak) if peak is not None else None)
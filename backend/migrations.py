@@ -0,0 +1,93 @@
+"""
+Versioned, non-destructive schema migrations.
+
+db.create_all() only creates missing tables; it never adds indexes or columns
+to a table that already exists. Each migration here is a list of idempotent
+statements (CREATE INDEX IF NOT EXISTS works on SQLite and Postgres) applied
+once, in order, and recorded in schema_migrations. Steps are SQL strings or
+callables for what SQL cannot say portably (SQLite has no ADD COLUMN IF NOT
+EXISTS). Append new migrations to MIGRATIONS; never edit one that has shipped.
+"""
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from models import db
+
+
+def add_column(table, column, ddl):
+    """ALTER TABLE ... ADD COLUMN, skipped if the column already exists."""
+    def step():
+        existing = {c['name'] for c in inspect(db.session.connection()).get_columns(table)}
+        if column not in existing:
+            db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+    return step
+
+
+MIGRATIONS = [
+    (1, 'feedback sentiment columns', [
+        # Databases created before sentiment analysis shipped
+        add_column('feedbacks', 'sentiment_score', 'FLOAT'),
+        add_column('feedbacks', 'sentiment_label', 'VARCHAR(20)'),
+    ]),
+    (2, 'feedback and activity log indexes', [
+        'CREATE INDEX IF NOT EXISTS ix_feedbacks_timestamp ON feedbacks (timestamp)',
+        'CREATE INDEX IF NOT EXISTS ix_feedbacks_salesperson_timestamp ON feedbacks (salesperson_id, timestamp)',
+        'CREATE INDEX IF NOT EXISTS ix_feedbacks_lead_label_timestamp ON feedbacks (lead_label, timestamp)',
+        'CREATE INDEX IF NOT EXISTS ix_feedbacks_sentiment_label_timestamp ON feedbacks (sentiment_label, timestamp)',
+        'CREATE INDEX IF NOT EXISTS ix_feedbacks_status_timestamp ON feedbacks (status, timestamp)',
+        'CREATE INDEX IF NOT EXISTS ix_activity_logs_timestamp ON activity_logs (timestamp)',
+        'CREATE INDEX IF NOT EXISTS ix_activity_logs_user_id ON activity_logs (user_id)',
+        'CREATE INDEX IF NOT EXISTS ix_users_role ON users (role)',
+    ]),
+    (3, 'rollup salesperson indexes', [
+        'CREATE INDEX IF NOT EXISTS ix_daily_rollups_salesperson_day ON daily_rollups (salesperson_id, day)',
+        'CREATE INDEX IF NOT EXISTS ix_term_counts_salesperson_day ON term_counts (salesperson_id, day)',
+    ]),
+    (4, 'feedback outcome labels', [
+        add_column('feedbacks', 'outcome', 'INTEGER'),
+        add_column('feedbacks', 'outcome_at', 'TIMESTAMP'),
+        'CREATE INDEX IF NOT EXISTS ix_feedbacks_outcome_at ON feedbacks (outcome_at, id)',
+    ]),
+]
+
+CREATE_TABLE = text(
+    'CREATE TABLE IF NOT EXISTS schema_migrations ('
+    'version INTEGER PRIMARY KEY, name VARCHAR(200) NOT NULL, applied_at TIMESTAMP NOT NULL)'
+)
+
+
+def applied_versions():
+    db.session.execute(CREATE_TABLE)
+    return {v for (v,) in db.session.execute(text('SELECT version FROM schema_migrations'))}
+
+
+def upgrade():
+    """Apply pending migrations, one transaction each. Returns the versions applied."""
+    db.create_all()
+    done = applied_versions()
+    db.session.commit()
+
+    applied = []
+    for version, name, statements in MIGRATIONS:
+        if version in done:
+            continue
+        for step in statements:
+            if callable(step):
+                step()
+            else:
+                db.session.execute(text(step))
+        db.session.execute(
+            text('INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)'),
+            {'v': version, 'n': name, 't': datetime.utcnow()},
+        )
+        db.session.commit()
+        applied.append(version)
+        print(f"✅ Applied migration {version}: {name}")
+    return applied
+
+
+def status():
+    done = applied_versions()
+    db.session.commit()
+    return [{'version': v, 'name': n, 'applied': v in done} for v, n, _ in MIGRATIONS]
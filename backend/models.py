@@ -1,5 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
+from passwords import hash_password
 from datetime import datetime
 
 db = SQLAlchemy()
@@ -10,7 +11,7 @@ class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
-    role = db.Column(db.String(20), nullable=False)  # salesperson, manager, dev
+    role = db.Column(db.String(20), nullable=False, index=True)  # salesperson, manager, dev (ix_users_role)
     last_login = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -19,7 +20,7 @@ class User(db.Model):
     activity_logs = db.relationship('ActivityLog', backref='user', lazy=True, cascade='all, delete-orphan')
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
@@ -53,10 +54,25 @@ class Feedback(db.Model):
     sentiment_label = db.Column(db.String(20), nullable=True) # For "Positive/Negative/Neutral"
     # ----------------------------------------
 
-    def to_dict(self):
+    # Recorded outcome of a lead (1 = won, 0 = lost); training labels for the online model
+    outcome = db.Column(db.Integer, nullable=True)
+    outcome_at = db.Column(db.DateTime, nullable=True)
+
+    # Keep in sync with migrations.py, which adds these to existing databases
+    __table_args__ = (
+        db.Index('ix_feedbacks_timestamp', 'timestamp'),
+        db.Index('ix_feedbacks_salesperson_timestamp', 'salesperson_id', 'timestamp'),
+        db.Index('ix_feedbacks_lead_label_timestamp', 'lead_label', 'timestamp'),
+        db.Index('ix_feedbacks_sentiment_label_timestamp', 'sentiment_label', 'timestamp'),
+        db.Index('ix_feedbacks_status_timestamp', 'status', 'timestamp'),
+        db.Index('ix_feedbacks_outcome_at', 'outcome_at', 'id'),
+    )
+
+    def to_dict(self, salesperson=None):
+        # Pass the username when it was joined in, to skip the lazy load per row
         return {
             'id': self.id,
-            'salesperson': self.salesperson.username,
+            'salesperson': salesperson if salesperson is not None else self.salesperson.username,
             'salesperson_id': self.salesperson_id,
             'text': self.text,
             'timestamp': self.timestamp.isoformat(),
@@ -66,7 +82,9 @@ class Feedback(db.Model):
             'lead_score': self.lead_score,
             'lead_label': self.lead_label,
             'sentiment_score': self.sentiment_score,
-            'sentiment_label': self.sentiment_label
+            'sentiment_label': self.sentiment_label,
+            'outcome': self.outcome,
+            'outcome_at': self.outcome_at.isoformat() if self.outcome_at else None
         }
 class Product(db.Model):
     __tablename__ = 'products'
@@ -95,17 +113,70 @@ class ActivityLog(db.Model):
     __tablename__ = 'activity_logs'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     action = db.Column(db.String(100), nullable=False)  # login, feedback_submit, product_add, etc.
     details = db.Column(db.Text, nullable=True)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
-    def to_dict(self):
+    def to_dict(self, username=None):
         return {
             'id': self.id,
             'user_id': self.user_id,
-            'username': self.user.username,
+            'username': username if username is not None else self.user.username,
             'action': self.action,
             'details': self.details,
             'timestamp': self.timestamp.isoformat()
-        }
\ No newline at end of file
+        }
+
+class DailyRollup(db.Model):
+    """
+    Feedback counts and score sums per (day, salesperson, status, lead_label,
+    sentiment_label). Maintained by rollups.record_feedback in the same
+    transaction as the Feedback insert; NULL labels are stored as '' so every
+    key column can sit in the primary key.
+    """
+    __tablename__ = 'daily_rollups'
+
+    day = db.Column(db.Date, primary_key=True)
+    salesperson_id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True, default='')
+    lead_label = db.Column(db.String(20), primary_key=True, default='')
+    sentiment_label = db.Column(db.String(20), primary_key=True, default='')
+
+    count = db.Column(db.Integer, nullable=False, default=0)
+    lead_score_sum = db.Column(db.Float, nullable=False, default=0.0)
+    lead_scored = db.Column(db.Integer, nullable=False, default=0)        # rows with a lead_score
+    sentiment_score_sum = db.Column(db.Float, nullable=False, default=0.0)
+    sentiment_scored = db.Column(db.Integer, nullable=False, default=0)   # rows with a sentiment_score
+
+    __table_args__ = (
+        db.Index('ix_daily_rollups_salesperson_day', 'salesperson_id', 'day'),
+    )
+
+
+class TermCount(db.Model):
+    """Wordcloud term occurrences in lead notes per (day, salesperson, lead_label)."""
+    __tablename__ = 'term_counts'
+
+    day = db.Column(db.Date, primary_key=True)
+    salesperson_id = db.Column(db.Integer, primary_key=True)
+    lead_label = db.Column(db.String(20), primary_key=True)
+    term = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_term_counts_salesperson_day', 'salesperson_id', 'day'),
+    )
+
+
+class TermTotal(db.Model):
+    """All-time term_counts per lead_label, indexed so the top terms are an index scan."""
+    __tablename__ = 'term_totals'
+
+    lead_label = db.Column(db.String(20), primary_key=True)
+    term = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_term_totals_rank', 'lead_label', count.desc(), 'term'),
+    )
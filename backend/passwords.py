@@ -0,0 +1,130 @@
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from time import perf_counter
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Any werkzeug method string: "scrypt", "scrypt:65536:8:1", "pbkdf2:sha256:1000000", ...
+HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+
+
+def hash_password(password, method=None):
+    return generate_password_hash(password, method=method or HASH_METHOD)
+
+
+@functools.cache
+def method_params(method):
+    """The full parameter prefix werkzeug writes for method, defaults filled in."""
+    return generate_password_hash('', method=method, salt_length=1).split('$', 1)[0]
+
+
+def needs_rehash(pwhash, method=None):
+    """True when pwhash was made with other parameters than the configured method."""
+    return pwhash.split('$', 1)[0] != method_params(method or HASH_METHOD)
+
+
+class PasswordPoolBusy(Exception):
+    """Too many hashes pending (or one took longer than the timeout); retry later."""
+
+
+class PasswordPool:
+    """
+    Runs password KDFs in a small process pool instead of on the request thread.
+
+    At most max_pending hashes may be queued or running per worker process;
+    beyond that verify()/hash() raise PasswordPoolBusy at once, so a burst of
+    logins turns into fast 503s rather than every request thread waiting on
+    the KDF. workers=0 hashes inline (still bounded by max_pending). The pool
+    is created on first use, after gunicorn has forked the worker, and its
+    processes come from a fork server so they never inherit request threads.
+    """
+
+    def __init__(self, workers=1, max_pending=4, timeout=5.0, method=None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.method = method or HASH_METHOD
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.total_ms = 0.0
+
+    def _executor(self):
+        if self._pool is None or self._pid != os.getpid():
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('forkserver'))
+            self._pid = os.getpid()
+        return self._pool
+
+    def _release(self, t0):
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+            self.total_ms += (perf_counter() - t0) * 1000
+
+    def _run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordPoolBusy(f"{self.pending} password hashes pending")
+            self.pending += 1
+            if self.workers:
+                executor = self._executor()
+        t0 = perf_counter()
+
+        if not self.workers:
+            try:
+                return fn(*args)
+            finally:
+                self._release(t0)
+
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            # A pool process died; start a fresh pool for the next caller
+            with self._lock:
+                self._pool = None
+            self._release(t0)
+            raise PasswordPoolBusy("password pool restarted")
+        # The slot is held until the KDF actually finishes, even if the caller gives up
+        future.add_done_callback(lambda _: self._release(t0))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            with self._lock:
+                self.timeouts += 1
+            raise PasswordPoolBusy(f"password hash took longer than {self.timeout}s")
+        except BrokenProcessPool:
+            with self._lock:
+                self._pool = None
+            raise PasswordPoolBusy("password pool restarted")
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def needs_rehash(self, pwhash):
+        return needs_rehash(pwhash, self.method)
+
+    def stats(self):
+        method = method_params(self.method)
+        with self._lock:
+            return {
+                'method': method,
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'pending': self.pending,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+                'avg_ms': round(self.total_ms / self.completed, 1) if self.completed else None,
+            }
@@ -0,0 +1,120 @@
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# What the views need from the authenticated user; no ORM object, no session
+Principal = namedtuple('Principal', 'id role username')
+
+
+class PrincipalCache:
+    """
+    Per-worker TTL cache of user id -> Principal, so token_required does not
+    query users on every request.
+
+    invalidate(user_id) drops the entry here and writes a fresh random nonce
+    to epoch_path; every worker reads that file (a few bytes) on lookup and
+    clears its cache when the nonce changes, so
+    a deleted or re-roled user loses access on the next request in any worker
+    on the host. ttl bounds staleness for anything that bypasses invalidate().
+    """
+
+    def __init__(self, loader, ttl=30.0, maxsize=10000, epoch_path=None):
+        self.loader = loader
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.epoch_path = epoch_path
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._epoch = self._read_epoch()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _read_epoch(self):
+        if not self.epoch_path:
+            return None
+        try:
+            with open(self.epoch_path, 'rb') as fh:
+                return fh.read()
+        except OSError:
+            return None
+
+    def get(self, user_id):
+        now = time.monotonic()
+        epoch = self._read_epoch()
+        with self._lock:
+            if epoch != self._epoch:
+                self._data.clear()
+                self._epoch = epoch
+                self._generation += 1
+            entry = self._data.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._data.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            generation = self._generation
+
+        principal = self.loader(user_id)
+        if principal is not None:  # unknown ids are never cached
+            with self._lock:
+                if generation != self._generation:
+                    return principal  # invalidated while loading; don't cache what may be stale
+                self._data[user_id] = (principal, now + self.ttl)
+                self._data.move_to_end(user_id)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return principal
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._data.pop(user_id, None)
+            self._generation += 1
+        if self.epoch_path:
+            directory = os.path.dirname(self.epoch_path)
+            os.makedirs(directory, exist_ok=True)
+            # A new nonce, not mtime/size, marks the change: two bumps within one mtime tick
+            # still differ, and the file stays 16 bytes. os.replace so readers never see it half-written
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix='.auth_epoch.')
+            try:
+                with os.fdopen(fd, 'w') as fh:
+                    fh.write(os.urandom(8).hex())
+                os.replace(tmp, self.epoch_path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {'size': len(self._data), 'ttl': self.ttl, 'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / total if total else 0.0}
+
+
+class TokenMemo:
+    """Decoded JWT payloads by token string, kept until the token's own exp."""
+
+    def __init__(self, decode, maxsize=10000):
+        self.decode = decode
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, token):
+        with self._lock:
+            payload = self._data.get(token)
+            if payload is not None:
+                if payload.get('exp', 0) > time.time():
+                    self._data.move_to_end(token)
+                    return payload
+                del self._data[token]
+
+        payload = self.decode(token)  # raises on bad signature / expiry
+        if 'exp' in payload:
+            with self._lock:
+                self._data[token] = payload
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return payload
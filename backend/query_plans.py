@@ -0,0 +1,60 @@
+"""
+EXPLAIN the app's key queries and report any that read a whole table.
+
+SQLite: a plan step "SCAN <table>" without "USING ... INDEX" is a full scan.
+Postgres: the check runs with enable_seqscan off, so a "Seq Scan" that is
+still chosen means no index can serve the query (on small tables the planner
+would otherwise prefer a sequential scan regardless).
+"""
+from sqlalchemy import text
+
+from models import db
+
+
+def _sqlite_full_scans(sql, params):
+    rows = db.session.execute(text('EXPLAIN QUERY PLAN ' + sql), params).all()
+    plan = [row[-1] for row in rows]
+    scans = [d for d in plan if d.startswith('SCAN ') and 'INDEX' not in d and 'CONSTANT ROW' not in d]
+    return scans, plan
+
+
+def _walk(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from _walk(child)
+
+
+def _postgres_full_scans(sql, params):
+    db.session.execute(text('SET LOCAL enable_seqscan = off'))
+    (doc,) = db.session.execute(text('EXPLAIN (FORMAT JSON) ' + sql), params).one()
+    nodes = list(_walk(doc[0]['Plan']))
+    plan = [f"{n['Node Type']} {n.get('Relation Name', '')}".strip() for n in nodes]
+    scans = [p for p, n in zip(plan, nodes) if n['Node Type'] == 'Seq Scan']
+    return scans, plan
+
+
+def full_scans(stmt):
+    """(full-scan steps, whole plan) for a SQLAlchemy select or ORM query."""
+    # Compiled with named binds, which text() re-binds for the connected driver
+    compiled = getattr(stmt, 'statement', stmt).compile()
+    sql, params = str(compiled), compiled.params
+    dialect = db.engine.dialect.name
+    try:
+        if dialect == 'sqlite':
+            return _sqlite_full_scans(sql, params)
+        if dialect == 'postgresql':
+            return _postgres_full_scans(sql, params)
+        raise RuntimeError(f"No query plan check for dialect {dialect!r}")
+    finally:
+        db.session.rollback()
+
+
+def check(queries):
+    """Print each query's plan verdict; returns the names of queries that full-scan."""
+    failed = []
+    for name, stmt in queries.items():
+        scans, plan = full_scans(stmt)
+        print(f"{'❌' if scans else '✅'} {name}: {' | '.join(plan)}")
+        if scans:
+            failed.append(name)
+    return failed
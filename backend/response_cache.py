@@ -0,0 +1,53 @@
+import threading
+from time import monotonic
+
+
+class ResponseCache:
+    """
+    One serialized response, valid until the write version moves or ttl expires.
+
+    Write paths call bump(); the next read rebuilds. Concurrent readers that miss
+    share a single build: the first one computes while the rest wait on the
+    build lock and then find the fresh entry. bump() only reaches this process,
+    so ttl bounds how stale another gunicorn worker's copy can get.
+    """
+
+    def __init__(self, ttl=15.0):
+        self.ttl = ttl
+        self.version = 0
+        self._entry = None  # (version, expires_at, body)
+        self._build_lock = threading.Lock()
+        self._version_lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+
+    def bump(self):
+        with self._version_lock:
+            self.version += 1
+
+    def _fresh(self):
+        entry = self._entry
+        if entry and entry[0] == self.version and entry[1] > monotonic():
+            return entry[2]
+        return None
+
+    def get(self, build):
+        """Cached body, or build() it once for everyone waiting."""
+        body = self._fresh()
+        if body is not None:
+            self.hits += 1
+            return body
+        with self._build_lock:
+            body = self._fresh()
+            if body is not None:
+                self.hits += 1
+                return body
+            # Read the version first: a write landing mid-build leaves this entry stale
+            version = self.version
+            body = build()
+            self._entry = (version, monotonic() + self.ttl, body)
+            self.builds += 1
+            return body
+
+    def stats(self):
+        return {'version': self.version, 'ttl': self.ttl, 'hits': self.hits, 'builds': self.builds}
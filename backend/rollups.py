@@ -0,0 +1,276 @@
+import re
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import db, Feedback, DailyRollup, TermCount, TermTotal
+
+KEY_COLUMNS = ('day', 'salesperson_id', 'status', 'lead_label', 'sentiment_label')
+VALUE_COLUMNS = ('count', 'lead_score_sum', 'lead_scored', 'sentiment_score_sum', 'sentiment_scored')
+TERM_KEY_COLUMNS = ('day', 'salesperson_id', 'lead_label', 'term')
+
+# Rows per INSERT ... ON CONFLICT statement (SQLite caps bound parameters per statement)
+UPSERT_CHUNK = 500
+
+LEAD_LABELS = ('High', 'Medium', 'Low')
+SENTIMENT_LABELS = ('Positive', 'Neutral', 'Negative')
+
+WORDCLOUD_STOP_WORDS = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'is', 'was', 'are', 'were', 'of', 'with', 'it', 'this', 'that', 'we', 'i', 'they'}
+WORD_RE = re.compile(r'\w+')
+MAX_TERM_LEN = 100  # TermCount.term column width
+
+
+def wordcloud_terms(text):
+    """Counter of the wordcloud terms in one note."""
+    return Counter(w for w in WORD_RE.findall(text.lower())
+                   if w not in WORDCLOUD_STOP_WORDS and 2 < len(w) <= MAX_TERM_LEN)
+
+
+def rollup_key(f):
+    return (f.timestamp.date(), f.salesperson_id, f.status or '', f.lead_label or '', f.sentiment_label or '')
+
+
+def record_feedback(entries, sign=1):
+    """
+    Add (sign=1) or remove (sign=-1) Feedback rows from the rollups and the
+    wordcloud term index inside the caller's transaction. Call after flush so
+    timestamps are set, and before commit. To relabel a row, record it with
+    sign=-1, change it, record again.
+    """
+    entries = list(entries)
+    deltas = {}
+    for f in entries:
+        d = deltas.setdefault(rollup_key(f), dict.fromkeys(VALUE_COLUMNS, 0))
+        d['count'] += sign
+        if f.lead_score is not None:
+            d['lead_score_sum'] += sign * f.lead_score
+            d['lead_scored'] += sign
+        if f.sentiment_score is not None:
+            d['sentiment_score_sum'] += sign * f.sentiment_score
+            d['sentiment_scored'] += sign
+    if deltas:
+        _upsert(DailyRollup, KEY_COLUMNS, VALUE_COLUMNS,
+                [dict(zip(KEY_COLUMNS, key), **values) for key, values in deltas.items()])
+
+    # Wordcloud terms, lead notes only
+    terms = Counter()
+    for f in entries:
+        if f.lead_label:
+            key = (f.timestamp.date(), f.salesperson_id, f.lead_label)
+            for term, n in wordcloud_terms(f.text).items():
+                terms[key + (term,)] += sign * n
+    _record_terms(terms)
+
+
+def _record_terms(terms):
+    """terms: Counter of (day, salesperson_id, lead_label, term) -> count delta."""
+    if not terms:
+        return
+    totals = Counter()
+    for (_, _, label, term), n in terms.items():
+        totals[(label, term)] += n
+    _upsert(TermCount, TERM_KEY_COLUMNS, ('count',),
+            [dict(zip(TERM_KEY_COLUMNS, key), count=n) for key, n in terms.items()])
+    _upsert(TermTotal, ('lead_label', 'term'), ('count',),
+            [{'lead_label': label, 'term': term, 'count': n} for (label, term), n in totals.items()])
+
+
+def _upsert(model, key_columns, value_columns, rows):
+    """Add each row's value columns onto the existing row with the same key, or insert it."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        # Atomic under concurrent writers: the increment happens inside the conflicting row's lock
+        insert_ = sqlite_insert if dialect == 'sqlite' else pg_insert
+        for i in range(0, len(rows), UPSERT_CHUNK):
+            stmt = insert_(model).values(rows[i:i + UPSERT_CHUNK])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(key_columns),
+                set_={c: getattr(model, c) + getattr(stmt.excluded, c) for c in value_columns},
+            )
+            db.session.execute(stmt)
+        return
+
+    for row in rows:
+        existing = db.session.get(model, tuple(row[c] for c in key_columns), with_for_update=True)
+        if existing is None:
+            db.session.add(model(**row))
+        else:
+            for c in value_columns:
+                setattr(existing, c, getattr(existing, c) + row[c])
+    db.session.flush()
+
+
+def forget_salesperson(salesperson_id):
+    """Drop a deleted user's rollups and terms (their feedback is deleted with them)."""
+    db.session.execute(delete(DailyRollup).where(DailyRollup.salesperson_id == salesperson_id))
+    removed = db.session.query(TermCount.lead_label, TermCount.term, func.sum(TermCount.count)) \
+        .filter(TermCount.salesperson_id == salesperson_id) \
+        .group_by(TermCount.lead_label, TermCount.term).all()
+    if removed:
+        _upsert(TermTotal, ('lead_label', 'term'), ('count',),
+                [{'lead_label': label, 'term': term, 'count': -n} for label, term, n in removed])
+    db.session.execute(delete(TermCount).where(TermCount.salesperson_id == salesperson_id))
+
+
+def _in_range(query, column, start, end):
+    if start is not None:
+        query = query.where(column >= datetime.combine(start, time.min))
+    if end is not None:
+        query = query.where(column < datetime.combine(end + timedelta(days=1), time.min))
+    return query
+
+
+def rebuild(start=None, end=None):
+    """
+    Recompute rollups for days in [start, end] (inclusive; None = unbounded)
+    from the feedbacks table with one INSERT ... SELECT, then the term index.
+    Returns the number of rollup rows written. The caller commits.
+    """
+    day = func.date(Feedback.timestamp)
+    keys = [day, Feedback.salesperson_id, func.coalesce(Feedback.status, ''),
+            func.coalesce(Feedback.lead_label, ''), func.coalesce(Feedback.sentiment_label, '')]
+    source = select(
+        *keys,
+        func.count(Feedback.id),
+        func.coalesce(func.sum(Feedback.lead_score), 0.0),
+        func.count(Feedback.lead_score),
+        func.coalesce(func.sum(Feedback.sentiment_score), 0.0),
+        func.count(Feedback.sentiment_score),
+    ).group_by(*keys)
+
+    source = _in_range(source, Feedback.timestamp, start, end)
+
+    db.session.execute(_days(delete(DailyRollup), DailyRollup.day, start, end))
+    result = db.session.execute(insert(DailyRollup).from_select(list(KEY_COLUMNS + VALUE_COLUMNS), source))
+    rebuild_terms(start, end)
+    return result.rowcount
+
+
+def _days(stmt, column, start, end):
+    if start is not None:
+        stmt = stmt.where(column >= start)
+    if end is not None:
+        stmt = stmt.where(column <= end)
+    return stmt
+
+
+def rebuild_terms(start=None, end=None, batch_size=1000):
+    """
+    Re-tokenize lead notes in [start, end] into term_counts, then recompute
+    term_totals from term_counts in SQL. Notes are streamed batch_size rows at
+    a time in timestamp order (ix_feedbacks_timestamp) and each day's counts
+    are inserted as soon as the day ends, so memory holds one day's terms,
+    not the corpus's.
+    """
+    db.session.execute(_days(delete(TermCount), TermCount.day, start, end))
+    notes = _in_range(
+        select(Feedback.timestamp, Feedback.salesperson_id, Feedback.lead_label, Feedback.text)
+        .where(Feedback.lead_label != None),
+        Feedback.timestamp, start, end,
+    ).order_by(Feedback.timestamp).execution_options(yield_per=batch_size)
+
+    def flush(terms):
+        rows = [dict(zip(TERM_KEY_COLUMNS, key), count=n) for key, n in terms.items()]
+        for i in range(0, len(rows), batch_size):
+            db.session.execute(insert(TermCount), rows[i:i + batch_size])
+
+    day, terms = None, Counter()
+    for ts, salesperson_id, label, text in db.session.execute(notes):
+        if ts.date() != day:
+            flush(terms)
+            day, terms = ts.date(), Counter()
+        key = (day, salesperson_id, label)
+        for term, n in wordcloud_terms(text).items():
+            terms[key + (term,)] += n
+    flush(terms)
+
+    db.session.execute(delete(TermTotal))
+    db.session.execute(insert(TermTotal).from_select(
+        ['lead_label', 'term', 'count'],
+        select(TermCount.lead_label, TermCount.term, func.sum(TermCount.count))
+        .group_by(TermCount.lead_label, TermCount.term),
+    ))
+
+
+def _filtered(query, start, end, salesperson_id):
+    if start is not None:
+        query = query.filter(DailyRollup.day >= start)
+    if end is not None:
+        query = query.filter(DailyRollup.day <= end)
+    if salesperson_id is not None:
+        query = query.filter(DailyRollup.salesperson_id == salesperson_id)
+    return query
+
+
+def label_counts(start=None, end=None, salesperson_id=None):
+    """Totals, label distributions and mean scores over a day range, from rollups only."""
+    rows = _filtered(db.session.query(
+        DailyRollup.lead_label, DailyRollup.sentiment_label,
+        func.sum(DailyRollup.count), func.sum(DailyRollup.lead_score_sum), func.sum(DailyRollup.lead_scored),
+        func.sum(DailyRollup.sentiment_score_sum), func.sum(DailyRollup.sentiment_scored),
+    ), start, end, salesperson_id).group_by(DailyRollup.lead_label, DailyRollup.sentiment_label).all()
+
+    leads = dict.fromkeys(LEAD_LABELS, 0)
+    sentiment = dict.fromkeys(SENTIMENT_LABELS, 0)
+    total = lead_sum = lead_n = sent_sum = sent_n = 0
+    for lead_label, sentiment_label, n, ls, ln, ss, sn in rows:
+        total += n
+        if lead_label in leads: leads[lead_label] += n
+        if sentiment_label in sentiment: sentiment[sentiment_label] += n
+        lead_sum += ls; lead_n += ln
+        sent_sum += ss; sent_n += sn
+    return {
+        'total': total,
+        'leads': leads,
+        'sentiment': sentiment,
+        'avg_lead_score': lead_sum / lead_n if lead_n else None,
+        'avg_sentiment_score': sent_sum / sent_n if sent_n else None,
+    }
+
+
+def daily_counts(start, end, salesperson_id=None):
+    """{date: count} for every day in [start, end], zero-filled."""
+    rows = _filtered(db.session.query(DailyRollup.day, func.sum(DailyRollup.count)),
+                     start, end, salesperson_id).group_by(DailyRollup.day).all()
+    per_day = dict(rows)
+    return {start + timedelta(days=i): per_day.get(start + timedelta(days=i), 0)
+            for i in range((end - start).days + 1)}
+
+
+def parse_day(value, default=None):
+    """YYYY-MM-DD query parameter -> date (ValueError on bad input)."""
+    return date.fromisoformat(value) if value else default
+
+
+def top_terms(label=None, start=None, end=None, salesperson_id=None, limit=50):
+    """
+    [[term, count], ...] for the wordcloud. label=None covers every lead label.
+    Without a window or salesperson this reads term_totals, which for a single
+    label is an index scan on ix_term_totals_rank; otherwise it sums
+    term_counts over the matching days.
+    """
+    if start is None and end is None and salesperson_id is None:
+        if label is not None:
+            query = db.session.query(TermTotal.term, TermTotal.count) \
+                .filter(TermTotal.lead_label == label, TermTotal.count > 0) \
+                .order_by(TermTotal.count.desc(), TermTotal.term)
+        else:
+            total = func.sum(TermTotal.count)
+            query = db.session.query(TermTotal.term, total).group_by(TermTotal.term) \
+                .having(total > 0).order_by(total.desc(), TermTotal.term)
+    else:
+        total = func.sum(TermCount.count)
+        query = db.session.query(TermCount.term, total)
+        if label is not None:
+            query = query.filter(TermCount.lead_label == label)
+        if start is not None:
+            query = query.filter(TermCount.day >= start)
+        if end is not None:
+            query = query.filter(TermCount.day <= end)
+        if salesperson_id is not None:
+            query = query.filter(TermCount.salesperson_id == salesperson_id)
+        query = query.group_by(TermCount.term).having(total > 0).order_by(total.desc(), TermCount.term)
+    return [[term, int(n)] for term, n in query.limit(limit)]
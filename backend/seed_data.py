@@ -1,5 +1,5 @@
-from app import app, db
-from models import User, Feedback
+from models import db, User, Feedback, Product
+import rollups
 from datetime import datetime, timedelta
 import random
 
@@ -22,7 +22,107 @@ SAMPLES = [
      ("Just looking around, no immediate need. Maybe next year.", 0.20, "Low"),
 ]
 
+def seed_defaults():
+    """
+    Default users, products and demo dashboard data, each only if its table is
+    empty. Used by `flask --app app seed-db`; needs an app context.
+    """
+    print("🌱 Checking database status...")
+
+    # 1. Seed Users
+    if not User.query.first():
+        print("👤 No users found. Seeding default users...")
+        dev = User(username='dev', role='dev'); dev.set_password('dev123')
+        mgr = User(username='manager', role='manager'); mgr.set_password('manager123')
+        sls = User(username='sales', role='salesperson'); sls.set_password('sales123')
+        db.session.add_all([dev, mgr, sls])
+        db.session.commit()
+        print("✅ Users seeded.")
+
+    # 2. Seed Products
+    if not Product.query.first():
+        print("📦 No products found. Seeding samples...")
+        db.session.add_all([
+            Product(name='Enterprise AI Suite', description='Full AI integration platform', details='Unlimited API calls, dedicated support', catalogue_info='SKU: AI-ENT-001'),
+            Product(name='Startup Starter Pack', description='Essential tools for small teams', details='Basic AI features, email support', catalogue_info='SKU: ST-BAS-101'),
+            Product(name='Consulting Services', description='Expert implementation help', details='Hourly rate, onsite available', catalogue_info='SKU: SRV-CON-999')
+        ])
+        db.session.commit()
+        print("✅ Products seeded.")
+
+    # 3. Seed Dashboard Data (Feedback)
+    if not Feedback.query.first():
+        print("📊 No feedback found. Seeding dashboard data...")
+        sales_user = User.query.filter_by(role='salesperson').first()
+        
+        if sales_user:
+            seeded = []
+            # --- 1. SEED 20 SAMPLE LEADS ---
+            print("...Seeding 20 sample leads...")
+            lead_samples = [
+                ("Loved the demo, budget approved, wants to start next week.", 0.95, "High"),
+                ("Very keen! Asked for a custom quote for 500 seats. Hot lead!", 0.98, "High"),
+                ("Meeting went okay. They liked Feature A. Need to nurture.", 0.55, "Medium"),
+                ("Just looking around, no immediate need. Maybe next year.", 0.20, "Low"),
+                ("Stuck in an existing contract for 6 months. Call back later.", 0.30, "Low"),
+                ("Great conversation. Decision maker needs approval from CEO.", 0.75, "High"),
+                ("Standard inquiry, sent pricing sheet. Waiting to hear back.", 0.50, "Medium"),
+                ("Had technical issues during the demo, they got frustrated.", 0.15, "Low"),
+                ("Impressed by the AI features. Wants a follow-up with their CTO.", 0.92, "High"),
+                ("Their team is too small for the Enterprise plan, pitched Startup pack.", 0.45, "Medium"),
+            ]
+            for _ in range(2): # Loop 2 times
+                for text, score, label in lead_samples: # 10 samples
+                    days_ago = random.randint(0, 9)
+                    fb = Feedback(
+                        salesperson_id=sales_user.id, 
+                        text=text, 
+                        lead_score=score,    # <-- Use lead columns
+                        lead_label=label,    # <-- Use lead columns
+                        status='lead',       # <-- Set status
+                        timestamp=datetime.utcnow() - timedelta(days=days_ago)
+                    )
+                    seeded.append(fb)
+
+            # --- 2. SEED 20 SAMPLE FEEDBACK (with sentiment) ---
+            print("...Seeding 20 sample feedback entries...")
+            feedback_samples = [
+                ("I am extremely happy with the support team, solved my issue in 5 minutes!", 0.9, "Positive"),
+                ("The new update is fantastic, everything runs so much faster.", 0.8, "Positive"),
+                ("It's an okay product, but it's missing a few key features.", 0.1, "Neutral"),
+                ("I am so frustrated. The app crashed and I lost all my work.", -0.8, "Negative"),
+                ("The pricing is way too high for what you get.", -0.5, "Negative"),
+                ("The documentation is unclear and hard to follow.", -0.4, "Negative"),
+                ("I like the product, it does exactly what it says it will do.", 0.6, "Positive"),
+                ("The user interface is a bit clunky but it works.", 0.2, "Neutral"),
+                ("Your competitor offers the same thing for half the price.", -0.3, "Negative"),
+                ("Just wanted to say thanks, this tool saved me hours of work.", 1.0, "Positive"),
+            ]
+            for _ in range(2): # Loop 2 times
+                for text, score, label in feedback_samples: # 10 samples
+                    days_ago = random.randint(0, 9)
+                    fb = Feedback(
+                        salesperson_id=sales_user.id, 
+                        text=text, 
+                        sentiment_score=score, # <-- Use sentiment columns
+                        sentiment_label=label, # <-- Use sentiment columns
+                        status='feedback',     # <-- Set status
+                        timestamp=datetime.utcnow() - timedelta(days=days_ago)
+                    )
+                    seeded.append(fb)
+
+            db.session.add_all(seeded)
+            db.session.flush()
+            rollups.record_feedback(seeded)
+            db.session.commit()
+            print("✅ Dashboard data (40 entries) seeded!")
+        else:
+            print("❌ ERROR: 'salesperson' user not found. Cannot seed data.")
+
+
+
 def seed_database():
+    from app import app
     with app.app_context():
         print("🌱 Starting database seed...")
         
@@ -35,6 +135,7 @@ def seed_database():
         # 2. Insert sample data spread over the last 10 days
         print(f"👤 Assigning feedback to salesperson: {sales_user.username}")
         count = 0
+        seeded = []
         for text, score, label in SAMPLES:
             # Randomize time to make charts look realistic
             days_ago = random.randint(0, 9)
@@ -50,8 +151,11 @@ def seed_database():
                 status='reviewed' if days_ago > 3 else 'new'
             )
             db.session.add(fb)
+            seeded.append(fb)
             count += 1
             
+        db.session.flush()
+        rollups.record_feedback(seeded)
         db.session.commit()
         print(f"✅ Success! Added {count} feedback entries to the database.")
         print("📊 Your dashboard charts will now have data to display.")
@@ -0,0 +1,105 @@
+import os
+import threading
+from contextlib import contextmanager
+from time import monotonic, perf_counter
+
+
+class StartupReport:
+    """
+    Per-phase timings for worker startup.
+
+    Import-time phases count against STARTUP_BUDGET_MS; phases marked lazy run
+    on first use (first request, first chat message, ...) and are listed
+    separately so their cost is visible without inflating cold start.
+    """
+
+    def __init__(self, budget_ms=None):
+        if budget_ms is None and os.environ.get('STARTUP_BUDGET_MS'):
+            budget_ms = float(os.environ['STARTUP_BUDGET_MS'])
+        self.budget_ms = budget_ms
+        self.phases = []
+        self._lock = threading.Lock()
+        self._last = perf_counter()
+
+    def _record(self, name, ms, lazy):
+        with self._lock:
+            self.phases.append({'phase': name, 'ms': round(ms, 1), 'lazy': lazy})
+
+    def mark(self, name):
+        """Close an import-time phase: everything since the previous mark."""
+        now = perf_counter()
+        self._record(name, (now - self._last) * 1000, False)
+        self._last = now
+
+    @contextmanager
+    def phase(self, name, lazy=False):
+        t0 = perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, (perf_counter() - t0) * 1000, lazy)
+
+    def import_ms(self):
+        return round(sum(p['ms'] for p in self.phases if not p['lazy']), 1)
+
+    def over_budget(self):
+        return self.budget_ms is not None and self.import_ms() > self.budget_ms
+
+    def log(self):
+        print(f"⏱️ Startup report (pid {os.getpid()}):")
+        for p in self.phases:
+            print(f"   {p['phase']:<20} {p['ms']:>9.1f} ms{'  (lazy)' if p['lazy'] else ''}")
+        budget = f" / budget {self.budget_ms:.0f} ms" if self.budget_ms is not None else ""
+        print(f"   {'import total':<20} {self.import_ms():>9.1f} ms{budget}")
+        if self.over_budget():
+            print("❌ WARNING: startup exceeded STARTUP_BUDGET_MS")
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'import_ms': self.import_ms(),
+                'budget_ms': self.budget_ms,
+                'over_budget': self.over_budget(),
+                'phases': list(self.phases),
+            }
+
+
+class Once:
+    """
+    Run fn() at most once per process, even under concurrent first requests.
+
+    retry_after: a None result is not kept; fn() runs again on the first call
+    at least retry_after seconds later (for lookups that can fail transiently).
+    wait=False: callers arriving while another thread runs fn() get None at
+    once instead of queueing behind it.
+    """
+
+    def __init__(self, fn, retry_after=None, wait=True):
+        self.fn = fn
+        self.retry_after = retry_after
+        self.wait = wait
+        self.done = False
+        self.result = None
+        self.failed_at = None
+        self._lock = threading.Lock()
+
+    def _cooling_down(self):
+        return self.failed_at is not None and monotonic() - self.failed_at < self.retry_after
+
+    def __call__(self):
+        if self.done or self._cooling_down():
+            return self.result
+        if not self._lock.acquire(blocking=self.wait):
+            return None
+        try:
+            if not self.done and not self._cooling_down():
+                result = self.fn()
+                if result is None and self.retry_after is not None:
+                    self.failed_at = monotonic()
+                else:
+                    self.result = result
+                    self.done = True
+            return self.result
+        finally:
+            self._lock.release()
@@ -1,5 +1,5 @@
 # analysis.py
-from textblob import TextBlob
+from sentiment import SENTIMENT
 import nltk
 from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize
@@ -10,10 +10,12 @@ STOP = set(stopwords.words('english'))
 
 def sentiment_score(text):
     """Return polarity [-1..1] and subjectivity [0..1]."""
-    if not text or not text.strip():
-        return {"polarity": 0.0, "subjectivity": 0.0}
-    tb = TextBlob(text)
-    return {"polarity": tb.sentiment.polarity, "subjectivity": tb.sentiment.subjectivity}
+    polarity, subjectivity = SENTIMENT.score(text)
+    return {"polarity": polarity, "subjectivity": subjectivity}
+
+def sentiment_scores(texts):
+    """sentiment_score for many texts in one pass."""
+    return [{"polarity": p, "subjectivity": s} for p, s in SENTIMENT.score_many(texts)]
 
 def top_keywords(text, top_n=5):
     """Return top N frequent alpha tokens excluding stopwords."""
@@ -0,0 +1,146 @@
+# batching.py
+import threading
+from collections import Counter, deque
+from time import monotonic
+
+
+class _Pending:
+    __slots__ = ("item", "enqueued", "done", "result", "error")
+
+    def __init__(self, item):
+        self.item = item
+        self.enqueued = monotonic()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-item calls into one fn(items) call.
+
+    fn takes a list and returns a list of results in the same order. A request
+    that arrives while nothing else is queued or running skips the queue and
+    calls fn directly. Otherwise it waits up to max_wait_ms (measured from the
+    oldest queued request) or until max_batch_size requests are queued, and a
+    background thread runs them as one batch. Each caller gets its own result.
+    """
+
+    def __init__(self, fn, max_batch_size=32, max_wait_ms=5.0):
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._in_flight = 0
+        self._thread = None
+
+        # metrics
+        self.batch_sizes = Counter()
+        self.bypassed = 0
+        self._delays = deque(maxlen=1000)
+        self._delay_total = 0.0
+        self._delay_count = 0
+        self._delay_max = 0.0
+
+    def submit(self, item):
+        return self.submit_many([item])[0]
+
+    def submit_many(self, items):
+        """Results for items, in order. Blocks until they are computed."""
+        items = list(items)
+        if not items:
+            return []
+
+        with self._cond:
+            idle = self._in_flight == 0 and not self._queue
+            if idle:
+                self._in_flight += len(items)
+                self.bypassed += 1
+            else:
+                pending = [_Pending(item) for item in items]
+                self._queue.extend(pending)
+                self._ensure_thread()
+                self._cond.notify()
+
+        if idle:
+            try:
+                return self.fn(items)
+            finally:
+                with self._cond:
+                    self._in_flight -= len(items)
+                    self.batch_sizes[len(items)] += 1
+
+        out = []
+        for p in pending:
+            p.done.wait()
+            if p.error is not None:
+                raise p.error
+            out.append(p.result)
+        return out
+
+    def _ensure_thread(self):
+        # Started lazily so gunicorn forks a process without a dispatcher thread in it
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+            self._thread.start()
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            deadline = self._queue[0].enqueued + self.max_wait
+            while len(self._queue) < self.max_batch_size:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = [self._queue.popleft() for _ in range(min(self.max_batch_size, len(self._queue)))]
+            self._in_flight += len(batch)
+
+            now = monotonic()
+            for p in batch:
+                delay = now - p.enqueued
+                self._delays.append(delay)
+                self._delay_total += delay
+                self._delay_count += 1
+                self._delay_max = max(self._delay_max, delay)
+            self.batch_sizes[len(batch)] += 1
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            try:
+                results = self.fn([p.item for p in batch])
+                for p, r in zip(batch, results):
+                    p.result = r
+            except Exception as e:
+                for p in batch:
+                    p.error = e
+            finally:
+                with self._cond:
+                    self._in_flight -= len(batch)
+                for p in batch:
+                    p.done.set()
+
+    def stats(self):
+        with self._cond:
+            delays = sorted(self._delays)
+            calls = sum(self.batch_sizes.values())
+            items = sum(size * n for size, n in self.batch_sizes.items())
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "calls": calls,
+                "items": items,
+                "mean_batch_size": items / calls if calls else 0.0,
+                "batch_sizes": {str(k): v for k, v in sorted(self.batch_sizes.items())},
+                "bypassed": self.bypassed,
+                "queued": len(self._queue),
+                "queue_delay_ms": {
+                    "mean": 1000 * self._delay_total / self._delay_count if self._delay_count else 0.0,
+                    "p95": 1000 * delays[int(len(delays) * 0.95)] if delays else 0.0,
+                    "max": 1000 * self._delay_max,
+                },
+            }
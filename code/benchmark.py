@@ -0,0 +1,456 @@
+# benchmark.py
+"""
+Micro-benchmarks for the lead scoring stack.
+
+Usage:
+  python code/benchmark.py calibration --baseline models/lead_pipeline.joblib --candidate models/lead_pipeline_shared.joblib
+  python code/benchmark.py linear --model models/lead_pipeline.joblib --linear models/lead_linear.npz
+  python code/benchmark.py cleaner
+  python code/benchmark.py batching --threads 16
+  python code/benchmark.py sentiment
+  python code/benchmark.py training --scale 100 --n-jobs -1
+  python code/benchmark.py search --scale 100 --n-iter 8 16 32
+  python code/benchmark.py online --scale 100 --new 100 1000 10000
+  python code/benchmark.py outofcore --rows 2000000
+
+Each subcommand prints a small table; nothing is written outside a temp dir.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from textblob import TextBlob
+
+from batching import MicroBatcher
+from predict_today import load_linear_model, load_model, predict_probabilities
+from sentiment import SentimentService, SentimentCache
+from text_cleaner import TextCleaner, LEMMA_CACHE  # TextCleaner is also needed to unpickle the pipelines
+
+
+# -----------------
+# Helpers
+# -----------------
+def load_notes(path, n=None):
+    df = pd.read_csv(path)
+    notes = df['note_text'].fillna('').astype(str).tolist()
+    return notes[:n] if n else notes
+
+
+def time_calls(fn, items, repeat=1):
+    """Call fn(item) for each item and return the per-call latencies in ms."""
+    out = []
+    for _ in range(repeat):
+        for item in items:
+            t0 = perf_counter()
+            fn(item)
+            out.append((perf_counter() - t0) * 1000)
+    return out
+
+
+def summarize(ms):
+    ms = sorted(ms)
+    p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+    return f"median {statistics.median(ms):7.3f} ms | p95 {p95:7.3f} ms"
+
+
+# -----------------
+# calibration: ensemble vs shared artifact
+# -----------------
+def bench_calibration(args):
+    notes = load_notes(args.data, args.n)
+    probs = {}
+    for name, path in (("baseline", args.baseline), ("candidate", args.candidate)):
+        t0 = perf_counter()
+        model = joblib.load(path)
+        load_ms = (perf_counter() - t0) * 1000
+        size_kb = os.path.getsize(path) / 1024
+
+        latency = time_calls(lambda t: model.predict_proba([t]), notes, repeat=args.repeat)
+        probs[name] = model.predict_proba(notes)[:, 1]
+        print(f"{name:9s} {size_kb:9.1f} KB | load {load_ms:7.1f} ms | per request {summarize(latency)}")
+
+    diff = np.abs(probs["baseline"] - probs["candidate"])
+    agree = np.mean((probs["baseline"] >= 0.5) == (probs["candidate"] >= 0.5))
+    print(f"max |dprob| {diff.max():.4f} | mean |dprob| {diff.mean():.4f} | label agreement {agree:.1%}")
+
+
+# -----------------
+# linear: exported NumPy engine vs sklearn pipeline
+# -----------------
+def bench_linear(args):
+    notes = load_notes(args.data, args.n)
+
+    t0 = perf_counter()
+    model = joblib.load(args.model)
+    print(f"joblib load   {(perf_counter() - t0) * 1000:8.1f} ms | {os.path.getsize(args.model) / 1024:8.1f} KB")
+    t0 = perf_counter()
+    linear = load_linear_model(args.linear)
+    print(f"linear load   {(perf_counter() - t0) * 1000:8.1f} ms | {os.path.getsize(args.linear) / 1024:8.1f} KB")
+
+    print(f"sklearn       per request {summarize(time_calls(lambda t: model.predict_proba([t]), notes))}")
+    print(f"linear        per request {summarize(time_calls(lambda t: linear.predict_proba([t]), notes))}")
+
+    diff = np.abs(model.predict_proba(notes)[:, 1] - linear.predict_proba(notes)[:, 1])
+    print(f"max |dprob| {diff.max():.2e} over {len(notes)} notes")
+    if diff.max() > args.tol:
+        raise SystemExit(f"Linear engine diverges from the pipeline (tolerance {args.tol})")
+
+
+# -----------------
+# cleaner: fast path vs current TextCleaner
+# -----------------
+PARITY_EXTRAS = [
+    "We cannot commit yet, gonna revisit after the board meets",
+    "They wanna see a demo; lemme know - gotta confirm budget. Gimme a call!",
+    "Email john@acme.com or visit https://acme.com/pricing (Q3 2024)",
+    "",
+]
+
+def bench_cleaner(args):
+    notes = load_notes(args.data, args.n) + PARITY_EXTRAS
+    baseline = TextCleaner()
+    fast = TextCleaner(fast=True, tokenizer="simple")
+
+    # Parity first: the fast path must not change a single feature
+    expected = baseline.transform(notes)
+    got = fast.transform(notes)
+    mismatches = [(n, e, g) for n, e, g in zip(notes, expected, got) if e != g]
+    for note, e, g in mismatches[:5]:
+        print(f"MISMATCH {note!r}\n  nltk: {e!r}\n  fast: {g!r}")
+    if mismatches:
+        raise SystemExit(f"{len(mismatches)} of {len(notes)} notes differ")
+    print(f"parity OK on {len(notes)} notes")
+
+    LEMMA_CACHE.clear()
+    print(f"current   per note {summarize(time_calls(baseline._clean_one, notes, repeat=args.repeat))}")
+    print(f"fast      per note {summarize(time_calls(fast._clean_one, notes, repeat=args.repeat))}")
+    print("lemma cache:", LEMMA_CACHE.stats())
+
+    if args.n_jobs:
+        bulk = notes * args.scale
+        for n_jobs in (None, args.n_jobs):
+            cleaner = TextCleaner(fast=True, tokenizer="simple", n_jobs=n_jobs, chunk_size=args.chunk_size)
+            t0 = perf_counter()
+            out = cleaner.transform(bulk)
+            elapsed = perf_counter() - t0
+            assert out == got * args.scale, "parallel transform changed the output or its order"
+            print(f"bulk n_jobs={n_jobs}: {len(bulk)} notes in {elapsed:.2f}s ({len(bulk) / elapsed:,.0f} notes/s)")
+
+
+# -----------------
+# batching: concurrent single-note requests, direct vs micro-batched
+# -----------------
+def bench_batching(args):
+    notes = load_notes(args.data, args.n)
+    model = load_model(args.model)
+
+    def direct(text):
+        return predict_probabilities(model, [text])[0]
+
+    batcher = MicroBatcher(lambda texts: predict_probabilities(model, texts),
+                           max_batch_size=args.max_batch, max_wait_ms=args.wait_ms)
+
+    for name, fn in (("direct", direct), ("batched", batcher.submit)):
+        with ThreadPoolExecutor(args.threads) as pool:
+            t0 = perf_counter()
+            latency = list(pool.map(lambda t: time_calls(fn, [t])[0], notes))
+            elapsed = perf_counter() - t0
+        print(f"{name:8s} {len(notes) / elapsed:8.0f} notes/s | per request {summarize(latency)}")
+
+    expected = predict_probabilities(model, notes)
+    got = [batcher.submit(t) for t in notes]
+    assert np.allclose(expected, got), "batched results do not match their callers"
+    stats = batcher.stats()
+    print(f"mean batch {stats['mean_batch_size']:.1f} | batch sizes {stats['batch_sizes']} | queue delay {stats['queue_delay_ms']}")
+
+
+# -----------------
+# sentiment: SentimentService vs a TextBlob per text
+# -----------------
+SENTIMENT_EXTRAS = [
+    "I am extremely happy with the support team, solved my issue in 5 minutes!",
+    "The pricing is way too high for what you get.",
+    "NOT good at all :( the demo crashed!!",
+    "   ",
+]
+
+def bench_sentiment(args):
+    notes = load_notes(args.data, args.n) + SENTIMENT_EXTRAS
+    service = SentimentService(cache=SentimentCache(maxsize=len(notes)))
+
+    def textblob(text):
+        return TextBlob(text).sentiment if text.strip() else (0.0, 0.0)
+
+    expected = [tuple(textblob(t)) for t in notes]
+    got = service.score_many(notes)
+    mismatches = [(n, e, g) for n, e, g in zip(notes, expected, got) if e != g]
+    for note, e, g in mismatches[:5]:
+        print(f"MISMATCH {note!r}\n  textblob: {e}\n  service:  {g}")
+    if mismatches:
+        raise SystemExit(f"{len(mismatches)} of {len(notes)} notes differ")
+    print(f"parity OK on {len(notes)} notes")
+
+    uncached = SentimentService()
+    print(f"textblob  per note {summarize(time_calls(textblob, notes, repeat=args.repeat))}")
+    print(f"service   per note {summarize(time_calls(uncached.score, notes, repeat=args.repeat))}")
+    print(f"cached    per note {summarize(time_calls(service.score, notes, repeat=args.repeat))}")
+    t0 = perf_counter()
+    uncached.score_many(notes)
+    print(f"batch     {len(notes)} notes in {(perf_counter() - t0) * 1000:.1f} ms")
+    print("sentiment cache:", service.cache.stats())
+
+
+# -----------------
+# training: per-fold cleaning vs clean-once (+ disk cache), serial vs parallel search
+# -----------------
+def synthetic_corpus(path, scale, seed=0):
+    """The labelled notes plus scale-1 copies whose words are shuffled per note (same labels, new n-grams)."""
+    df = pd.read_csv(path)
+    rng = np.random.default_rng(seed)
+    copies = [df]
+    for _ in range(scale - 1):
+        copy = df.copy()
+        copy['note_text'] = [" ".join(rng.permutation(str(t).split())) for t in df['note_text'].fillna('')]
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+
+def bench_training(args):
+    import train_model
+
+    with tempfile.TemporaryDirectory(prefix="train-bench-") as tmp:
+        data = args.data
+        if args.scale > 1:
+            data = os.path.join(tmp, "synthetic.csv")
+            synthetic_corpus(args.data, args.scale).to_csv(data, index=False)
+        rows = len(pd.read_csv(data))
+
+        runs = [("per-fold", 1, "per-fold"), ("once, cold cache", 1, "once"), ("once, warm cache", 1, "once")]
+        if args.n_jobs not in (None, 1):
+            runs.append((f"once, warm, n_jobs={args.n_jobs}", args.n_jobs, "once"))
+        print(f"{rows} rows, --n-iter {args.n_iter}, {os.cpu_count()} core(s)")
+        for name, n_jobs, clean in runs:
+            run_args = argparse.Namespace(
+                data=data, out=os.path.join(tmp, "model.joblib"), test_size=0.2, n_iter=args.n_iter,
+                calibration="shared", clean_jobs=None, export_linear=None,
+                clean=clean, clean_cache=os.path.join(tmp, "clean_cache"), n_jobs=n_jobs,
+                search="random", halving_factor=3, time_budget=None,
+            )
+            log = io.StringIO()
+            t0 = perf_counter()
+            with contextlib.redirect_stdout(log):
+                train_model.main(run_args)
+            elapsed = perf_counter() - t0
+            best = next((l for l in log.getvalue().splitlines() if l.startswith("Best params")), "")
+            print(f"{name:<28} {elapsed:8.1f}s | {best}")
+
+
+# -----------------
+# search: random vs successive halving as --n-iter grows
+# -----------------
+def bench_search(args):
+    import train_model
+
+    with tempfile.TemporaryDirectory(prefix="search-bench-") as tmp:
+        data = args.data
+        if args.scale > 1:
+            data = os.path.join(tmp, "synthetic.csv")
+            synthetic_corpus(args.data, args.scale).to_csv(data, index=False)
+        print(f"{len(pd.read_csv(data))} rows, {os.cpu_count()} core(s), search time only (corpus cleaned once, cached)")
+        print(f"{'mode':<8} {'n_iter':>6} {'evaluated':>9} {'search s':>9} {'best CV F1':>10} {'test F1':>8}")
+        for search in args.modes:
+            for n_iter in args.n_iter:
+                run_args = argparse.Namespace(
+                    data=data, out=os.path.join(tmp, "model.joblib"), test_size=0.2, n_iter=n_iter,
+                    calibration="shared", clean_jobs=None, export_linear=None, clean="once",
+                    clean_cache=os.path.join(tmp, "clean_cache"), n_jobs=args.n_jobs,
+                    search=search, halving_factor=args.factor, time_budget=args.time_budget,
+                )
+                with contextlib.redirect_stdout(io.StringIO()):
+                    r = train_model.main(run_args)
+                budget = " (budget hit)" if r['budget_exhausted'] else ""
+                print(f"{search:<8} {n_iter:>6} {r['candidates']:>9} {r['search_seconds']:>9.1f} "
+                      f"{r['best_cv_f1']:>10.4f} {r['test_f1']:>8.4f}{budget}")
+
+
+# -----------------
+# online: partial_fit on new rows vs refitting the whole history
+# -----------------
+def bench_online(args):
+    from online_model import OnlineLeadModel, save_checkpoint
+
+    history = synthetic_corpus(args.data, args.scale)
+    X, y = history['note_text'].fillna('').astype(str).values, history['label'].astype(int).values
+    model = OnlineLeadModel(n_features=2 ** args.hash_bits)
+    LEMMA_CACHE.clear()
+    t0 = perf_counter()
+    model.fit(X, y, epochs=args.epochs)
+    full = perf_counter() - t0
+    with tempfile.TemporaryDirectory(prefix="online-bench-") as tmp:
+        path = os.path.join(tmp, "online.joblib")
+        save_checkpoint(model, path)
+        size = os.path.getsize(path)
+    coef_mb = model.clf_.coef_.nbytes / 2 ** 20
+    print(f"{len(y)} rows of history, 2^{args.hash_bits} features: coef {coef_mb:.1f} MB in memory, "
+          f"checkpoint {size / 1024:.0f} KB, {os.cpu_count()} core(s)")
+    print(f"{'full refit (' + str(args.epochs) + ' epochs)':<26} {len(y):>7} rows {full:8.2f}s")
+
+    base = len(pd.read_csv(args.data))
+    # Other shuffles than the history's; the original notes (seen already) are dropped
+    new = synthetic_corpus(args.data, 1 + -(-max(args.new) // base), seed=1).iloc[base:]
+    for n in args.new:
+        batch = new.iloc[:n]
+        t0 = perf_counter()
+        model.partial_fit(batch['note_text'].astype(str).values, batch['label'].values)
+        elapsed = perf_counter() - t0
+        print(f"{'partial_fit':<26} {len(batch):>7} rows {elapsed:8.2f}s   {elapsed / full:6.1%} of a refit")
+
+
+# -----------------
+# outofcore: peak memory of streamed training vs loading the CSV whole
+# -----------------
+# What train_model.py / inspect_errors.py do before any training starts
+LOAD_WHOLE = """
+import sys, pandas as pd
+sys.path.insert(0, {code!r})
+from online_model import peak_memory_mb
+df = pd.read_csv({data!r})
+X = df['note_text'].fillna('').astype(str).values
+y = df['label'].astype(int).values
+print(f"Peak memory: {{peak_memory_mb():.0f}} MB")
+"""
+
+
+def write_synthetic_csv(src, path, rows, chunk=100000, seed=0):
+    """rows word-shuffled copies of src's notes, written chunk by chunk (never all in memory)."""
+    df = pd.read_csv(src)
+    rng = np.random.default_rng(seed)
+    words = [str(t).split() for t in df['note_text'].fillna('')]
+    written = 0
+    while written < rows:
+        n = min(chunk, rows - written)
+        idx = rng.integers(0, len(df), n)
+        pd.DataFrame({
+            'note_text': [" ".join(rng.permutation(words[i])) for i in idx],
+            'label': df['label'].values[idx],
+        }).to_csv(path, mode='a', header=not written, index=False)
+        written += n
+
+
+def peak_of(cmd):
+    t0 = perf_counter()
+    out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+    line = next(l for l in out.splitlines() if l.startswith("Peak memory"))
+    return float(line.split()[2]), perf_counter() - t0
+
+
+def bench_outofcore(args):
+    code = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory(prefix="outofcore-bench-") as tmp:
+        data = os.path.join(tmp, "large.csv")
+        write_synthetic_csv(args.data, data, args.rows)
+        print(f"{args.rows} rows, {os.path.getsize(data) / 2 ** 20:.0f} MB CSV, {os.cpu_count()} core(s)")
+        runs = [("pd.read_csv, whole file", [sys.executable, "-c", LOAD_WHOLE.format(code=code, data=data)])]
+        for chunksize in args.chunksize:
+            runs.append((f"online_model.py, chunks of {chunksize}", [
+                sys.executable, os.path.join(code, "online_model.py"), "--data", data,
+                "--out", os.path.join(tmp, "online.joblib"), "--epochs", "1",
+                "--chunksize", str(chunksize), "--holdout", str(args.holdout)]))
+        for name, cmd in runs:
+            peak, elapsed = peak_of(cmd)
+            print(f"{name:<34} peak {peak:7.0f} MB {elapsed:8.1f}s")
+
+
+# -----------------
+# CLI entrypoint
+# -----------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("calibration", help="Compare ensemble vs shared calibration artifacts")
+    p.add_argument("--baseline", type=str, default="models/lead_pipeline.joblib")
+    p.add_argument("--candidate", type=str, required=True)
+    p.add_argument("--data", type=str, default="data/clean_sales_data.csv")
+    p.add_argument("--n", type=int, default=200, help="Number of notes to score")
+    p.add_argument("--repeat", type=int, default=1)
+    p.set_defaults(func=bench_calibration)
+
+    p = sub.add_parser("linear", help="Check the exported linear engine against the pipeline")
+    p.add_argument("--model", type=str, default="models/lead_pipeline.joblib")
+    p.add_argument("--linear", type=str, required=True)
+    p.add_argument("--data", type=str, default="data/clean_sales_data.csv")
+    p.add_argument("--n", type=int, default=200)
+    p.add_argument("--tol", type=float, default=1e-5)
+    p.set_defaults(func=bench_linear)
+
+    p = sub.add_parser("cleaner", help="Parity + latency of the TextCleaner fast path")
+    p.add_argument("--data", type=str, default="data/clean_sales_data.csv")
+    p.add_argument("--n", type=int, default=None)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--n-jobs", type=int, default=None, help="Also time a bulk transform with this many processes")
+    p.add_argument("--scale", type=int, default=200, help="Corpus copies for the bulk transform")
+    p.add_argument("--chunk-size", type=int, default=1000)
+    p.set_defaults(func=bench_cleaner)
+
+    p = sub.add_parser("batching", help="Concurrent single-note throughput with and without MicroBatcher")
+    p.add_argument("--model", type=str, default="models/lead_pipeline.joblib")
+    p.add_argument("--data", type=str, default="data/clean_sales_data.csv")
+    p.add_argument("--n", type=int, default=500)
+    p.add_argument("--threads", type=int, default=16)
+    p.add_argument("--max-batch", type=int, default=32)
+    p.add_argument("--wait-ms", type=float, default=5.0)
+    p.set_defaults(func=bench_batching)
+
+    p = sub.add_parser("sentiment", help="Parity + latency of SentimentService against TextBlob")
+    p.add_argument("--data", type=str, default="data/clean_sales_data.csv")
+    p.add_argument("--n", type=int, default=None)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_sentiment)
+
+    p = sub.add_parser("training", help="Wall-clock of train_model.py: per-fold vs clean-once cleaning")
+    p.add_argument("--data", type=str, default="data/clean_sales_data.csv")
+    p.add_argument("--scale", type=int, default=1, help="Corpus size multiplier (synthetic word-shuffled copies)")
+    p.add_argument("--n-iter", type=int, default=8)
+    p.add_argument("--n-jobs", type=int, default=None, help="Also time a parallel search with this many jobs")
+    p.set_defaults(func=bench_training)
+
+    p = sub.add_parser("search", help="Search time vs best F1: random vs successive halving over --n-iter")
+    p.add_argument("--data", type=str, default="data/clean_sales_data.csv")
+    p.add_argument("--scale", type=int, default=1, help="Corpus size multiplier (synthetic word-shuffled copies)")
+    p.add_argument("--n-iter", type=int, nargs="+", default=[8, 16, 32])
+    p.add_argument("--modes", nargs="+", choices=["random", "halving"], default=["random", "halving"])
+    p.add_argument("--factor", type=int, default=3, help="Halving factor")
+    p.add_argument("--time-budget", type=float, default=None)
+    p.add_argument("--n-jobs", type=int, default=1)
+    p.set_defaults(func=bench_search)
+
+    p = sub.add_parser("online", help="Online model: partial_fit on new rows vs a full refit of the history")
+    p.add_argument("--data", type=str, default="data/clean_sales_data.csv")
+    p.add_argument("--scale", type=int, default=100, help="History size multiplier (synthetic word-shuffled copies)")
+    p.add_argument("--new", type=int, nargs="+", default=[100, 1000, 10000], help="New labeled rows per update")
+    p.add_argument("--hash-bits", type=int, default=20)
+    p.add_argument("--epochs", type=int, default=5)
+    p.set_defaults(func=bench_online)
+
+    p = sub.add_parser("outofcore", help="Peak memory: streamed online training vs loading the CSV whole")
+    p.add_argument("--data", type=str, default="data/clean_sales_data.csv")
+    p.add_argument("--rows", type=int, default=2000000, help="Rows in the synthetic CSV")
+    p.add_argument("--chunksize", type=int, nargs="+", default=[10000, 100000])
+    p.add_argument("--holdout", type=int, default=10000)
+    p.set_defaults(func=bench_outofcore)
+
+    args = parser.parse_args()
+    args.func(args)
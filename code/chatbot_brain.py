@@ -2,7 +2,7 @@
 
 import random
 from analysis import sentiment_score, top_keywords
-from predict_today import load_model, predict_probability
+from predict_today import load_model, predict_lead
 from text_cleaner import TextCleaner
 
 # load model once
@@ -47,8 +47,7 @@ def handle(session_id, message, note_text=None):
             return {"reply":"Model not available. Train the model and place it at models/lead_pipeline.joblib", "intent":intent, "score":0.0}
         if not note_text:
             return {"reply":"Provide meeting notes for prediction.", "intent":intent, "score":0.4}
-        prob = predict_probability(model, note_text)
-        label = "High" if prob >= 0.7 else ("Medium" if prob >= 0.45 else "Low")
+        prob, label = predict_lead(model, note_text)
         return {"reply": INTENTS[3]["responses"][0].format(prob=prob), "intent":intent, "score":float(prob), "meta":{"probability":prob, "label":label}}
 
     if intent == "greeting":
@@ -0,0 +1,90 @@
+# data_stream.py
+"""
+Streaming training data: labeled notes in bounded chunks, never the whole corpus.
+
+csv_chunks reads a note_text,label CSV chunksize rows at a time. The backend
+streams Feedback rows the same way through a server-side cursor
+(lead_updater.feedback_chunks). ReservoirHoldout splits any such stream into
+training chunks and a fixed-size, uniformly sampled holdout set, so the
+training path's memory depends on chunksize and the holdout size, not on the
+file.
+"""
+
+import numpy as np
+import pandas as pd
+
+REQUIRED_COLUMNS = ("note_text", "label")
+
+
+def csv_chunks(path, chunksize=10000):
+    """(texts, labels) arrays, chunksize rows at a time, in file order."""
+    header = pd.read_csv(path, nrows=0).columns
+    missing = [c for c in REQUIRED_COLUMNS if c not in header]
+    if missing:
+        raise ValueError("CSV must contain 'note_text' and 'label' columns")
+    with pd.read_csv(path, usecols=list(REQUIRED_COLUMNS), chunksize=chunksize,
+                     dtype={"note_text": str}, keep_default_na=False) as reader:
+        for chunk in reader:
+            yield chunk["note_text"].to_numpy(dtype=object), chunk["label"].to_numpy(dtype=int)
+
+
+class ReservoirHoldout:
+    """
+    Reservoir-samples (algorithm R) up to size rows of a stream as the holdout
+    set and yields every other row for training. A row pushed out of the
+    reservoir by a later one is yielded for training then, so each row is used
+    exactly once: trained on, or held out. When the stream turns out shorter
+    than size / max_fraction rows, a random surplus is released for training
+    at the end so the holdout is at most max_fraction of the data.
+
+    The draws depend only on seed and the row order, so every pass over the
+    same stream (one per epoch) holds out the same rows.
+    """
+
+    def __init__(self, size=10000, max_fraction=0.2, seed=42):
+        self.size = size
+        self.max_fraction = max_fraction
+        self.seed = seed
+        self.texts = []
+        self.labels = []
+        self.seen = 0
+
+    def split(self, chunks):
+        """Training (texts, labels) chunks from chunks; afterwards texts/labels hold the holdout."""
+        rng = np.random.default_rng(self.seed)
+        self.texts, self.labels, self.seen = [], [], 0
+        for texts, labels in chunks:
+            n = len(labels)
+            # Row i (1-based, over the whole stream) lands on slot floor(u * i); only slots < size keep it
+            slots = (rng.random(n) * np.arange(self.seen + 1, self.seen + n + 1)).astype(np.int64)
+            slots[:max(0, min(n, self.size - self.seen))] = -1  # reservoir still filling: always kept
+            keep = slots < self.size
+            train = ~keep
+            evicted = []
+            for i in np.flatnonzero(keep):
+                if slots[i] < 0:
+                    self.texts.append(texts[i])
+                    self.labels.append(labels[i])
+                else:
+                    evicted.append((self.texts[slots[i]], self.labels[slots[i]]))
+                    self.texts[slots[i]], self.labels[slots[i]] = texts[i], labels[i]
+            self.seen += n
+            train_texts, train_labels = texts[train], labels[train]
+            if evicted:
+                train_texts = np.concatenate([train_texts, np.array([t for t, _ in evicted], dtype=object)])
+                train_labels = np.concatenate([train_labels, np.array([l for _, l in evicted], dtype=int)])
+            if len(train_labels):
+                yield train_texts, train_labels
+
+        surplus = len(self.labels) - int(self.seen * self.max_fraction)
+        if surplus > 0:
+            released = np.sort(rng.choice(len(self.labels), surplus, replace=False))
+            keep = np.ones(len(self.labels), dtype=bool)
+            keep[released] = False
+            texts, labels = np.array(self.texts, dtype=object), np.array(self.labels, dtype=int)
+            self.texts, self.labels = list(texts[keep]), list(labels[keep])
+            yield texts[released], labels[released]
+
+    def holdout(self):
+        """(texts, labels) arrays of the rows held out by the last split()."""
+        return np.array(self.texts, dtype=object), np.array(self.labels, dtype=int)
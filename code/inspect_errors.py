@@ -4,26 +4,51 @@ Inspect model mistakes.
 
 Usage:
   python code\inspect_errors.py --data data/clean_sales_data.csv --model models/lead_pipeline.joblib --test-size 0.2 --max-show 10
+  python code\inspect_errors.py --threshold 0.4 --sweep-step 0.05
 
 What it does:
 - Loads CSV with columns: note_text,label
 - Splits into train/test (same defaults as train_model.py)
 - Loads saved pipeline (joblib)
-- Predicts on test set and prints metrics
-- Prints top false positives and false negatives (up to max_show)
+- Scores the test set with one predict_proba call; labels are prob > --threshold
+- Prints metrics and top false positives and false negatives (up to max_show)
+- Prints precision/recall/F1 at every --sweep-step threshold from the same probabilities
 - Saves models/misclassified.csv with columns: note_text,label,pred,prob,error_type
+  and models/threshold_sweep.csv
+
+The test notes, labels and probabilities are cached in --cache-dir, keyed by
+the model file's hash, the data file's hash and the split parameters. A rerun
+with the same three (e.g. a different --threshold or --max-show) neither
+parses the CSV nor loads the model.
 """
 
 import argparse
+import hashlib
 import joblib
 import os
+import numpy as np
 import pandas as pd
+from time import time
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, roc_auc_score, confusion_matrix, classification_report
 from sklearn.model_selection import train_test_split
-from train_model import TextCleaner
-from text_cleaner import TextCleaner
 
-def main(args):
+PREDICTION_CACHE_VERSION = 1
+RANDOM_STATE = 42
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def prediction_cache_key(model_path, data_path, test_size):
+    """Hash of the model file, the data file and the split parameters."""
+    parts = [PREDICTION_CACHE_VERSION, file_hash(model_path), file_hash(data_path), test_size, RANDOM_STATE]
+    return hashlib.sha256("|".join(map(str, parts)).encode()).hexdigest()[:20]
+
+def score_test_set(args):
+    """Split the data and score the test set: dict of note_text, label and prob (None without predict_proba)."""
     print("Loading data:", args.data)
     df = pd.read_csv(args.data)
     if 'note_text' not in df.columns or 'label' not in df.columns:
@@ -32,22 +57,80 @@ def main(args):
     X = df['note_text'].fillna('').astype(str).values
     y = df['label'].astype(int).values
 
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=args.test_size, random_state=42, stratify=y)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=args.test_size, random_state=RANDOM_STATE, stratify=y)
     print(f"Using test set of {len(X_test)} samples (test_size={args.test_size})")
 
-    if not os.path.exists(args.model):
-        raise FileNotFoundError(f"Model file not found: {args.model}")
-
     print("Loading model:", args.model)
+    # Pipelines pickled from a script look TextCleaner up in __main__. Imported
+    # here rather than at the top so cache hits never pay for importing NLTK.
+    from text_cleaner import TextCleaner
+    globals().setdefault("TextCleaner", TextCleaner)
     model = joblib.load(args.model)
 
     print("Predicting...")
+    t0 = time()
     try:
         probs = model.predict_proba(X_test)[:, 1]
+        preds = None
     except Exception:
         probs = None
+        preds = model.predict(X_test)
+    print(f"Scored {len(X_test)} notes in {time() - t0:.1f}s")
+    return {"note_text": X_test, "label": y_test, "prob": probs, "pred": preds}
 
-    preds = model.predict(X_test)
+def load_predictions(args):
+    """score_test_set(args), read from / written to args.cache_dir when set."""
+    if not os.path.exists(args.model):
+        raise FileNotFoundError(f"Model file not found: {args.model}")
+    if not args.cache_dir:
+        return score_test_set(args)
+
+    path = os.path.join(args.cache_dir, f"pred-{prediction_cache_key(args.model, args.data, args.test_size)}.joblib")
+    if os.path.exists(path):
+        print("Loaded test-set predictions from cache:", path)
+        return joblib.load(path)
+
+    scored = score_test_set(args)
+    os.makedirs(args.cache_dir, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(scored, tmp)
+    os.replace(tmp, path)  # readers never see a half-written file
+    print("Cached test-set predictions to:", path)
+    return scored
+
+def threshold_sweep(y, probs, thresholds):
+    """Precision/recall/F1 and positive rate at every threshold (prob > t), in one vectorized pass."""
+    y = np.asarray(y, dtype=bool)
+    predicted = probs[None, :] > thresholds[:, None]  # (n_thresholds, n_notes)
+    tp = (predicted & y).sum(axis=1)
+    fp = (predicted & ~y).sum(axis=1)
+    fn = y.sum() - tp
+    precision = np.divide(tp, tp + fp, out=np.zeros(len(thresholds)), where=(tp + fp) > 0)
+    recall = np.divide(tp, tp + fn, out=np.zeros(len(thresholds)), where=(tp + fn) > 0)
+    f1 = np.divide(2 * precision * recall, precision + recall, out=np.zeros(len(thresholds)),
+                   where=(precision + recall) > 0)
+    return pd.DataFrame({
+        "threshold": thresholds.round(4),
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+        "positive_rate": predicted.mean(axis=1),
+        "false_positives": fp,
+        "false_negatives": fn,
+    })
+
+def sweep_step(value):
+    """argparse type for --sweep-step: 0 (no sweep) or a step strictly between 0 and 1."""
+    step = float(value)
+    if not 0 <= step < 1:
+        raise argparse.ArgumentTypeError(f"must be 0 (skip) or between 0 and 1, got {value}")
+    return step
+
+def main(args):
+    scored = load_predictions(args)
+    X_test, y_test, probs = scored["note_text"], scored["label"], scored["prob"]
+    # One predict_proba pass serves both; at 0.5 this is what the pipeline's predict returns
+    preds = (probs > args.threshold).astype(int) if probs is not None else scored["pred"]
 
     # Metrics
     acc = accuracy_score(y_test, preds)
@@ -56,7 +139,7 @@ def main(args):
     f1 = f1_score(y_test, preds, zero_division=0)
     roc = roc_auc_score(y_test, probs) if probs is not None else None
 
-    print("\n=== Evaluation on test set ===")
+    print(f"\n=== Evaluation on test set (threshold {args.threshold}) ===")
     print(f"Accuracy:  {acc:.4f}")
     print(f"Precision: {prec:.4f}")
     print(f"Recall:    {rec:.4f}")
@@ -79,14 +162,11 @@ def main(args):
         df_out["prob"] = None
 
     # error types
-    def error_type(row):
-        if row["label"] == row["pred"]:
-            return "correct"
-        if row["label"] == 1 and row["pred"] == 0:
-            return "false_negative"
-        return "false_positive"
-
-    df_out["error_type"] = df_out.apply(error_type, axis=1)
+    df_out["error_type"] = np.select(
+        [df_out["label"].values == df_out["pred"].values, df_out["label"].values == 1],
+        ["correct", "false_negative"],
+        default="false_positive",
+    )
 
     # Print sample false negatives and false positives
     fn = df_out[df_out["error_type"] == "false_negative"].sort_values(by="prob", ascending=True).head(args.max_show)
@@ -101,10 +181,22 @@ def main(args):
         print(f"- prob={r['prob']:.3f} | note: {r['note_text'][:200]}")
 
     # Save CSV of misclassified
-    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
     df_out.to_csv(args.output, index=False)
     print(f"\nSaved detailed results to: {args.output}")
 
+    # Threshold sweep from the same probabilities; the model is not run again
+    if probs is not None and args.sweep_step:
+        thresholds = np.arange(args.sweep_step, 1, args.sweep_step)
+        sweep = threshold_sweep(y_test, probs, thresholds)
+        best = sweep.loc[sweep["f1"].idxmax()]
+        print("\n=== Threshold sweep (predicted positive when prob > threshold) ===")
+        print(sweep.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+        print(f"Best F1 {best['f1']:.4f} at threshold {best['threshold']:.2f}")
+        os.makedirs(os.path.dirname(args.sweep_output) or ".", exist_ok=True)
+        sweep.to_csv(args.sweep_output, index=False)
+        print(f"Saved threshold sweep to: {args.sweep_output}")
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--data", type=str, default="data/clean_sales_data.csv")
@@ -112,5 +204,12 @@ if __name__ == "__main__":
     parser.add_argument("--test-size", type=float, default=0.2)
     parser.add_argument("--output", type=str, default="models/misclassified.csv")
     parser.add_argument("--max-show", type=int, default=10)
+    parser.add_argument("--threshold", type=float, default=0.5,
+                        help="Predict 1 when prob > threshold")
+    parser.add_argument("--sweep-step", type=sweep_step, default=0.05,
+                        help="Threshold sweep spacing (0 to skip the sweep)")
+    parser.add_argument("--sweep-output", type=str, default="models/threshold_sweep.csv")
+    parser.add_argument("--cache-dir", type=str, default="models/.predictions_cache",
+                        help="Directory caching test-set predictions by model + data hash and split ('' to disable)")
     args = parser.parse_args()
     main(args)
@@ -0,0 +1,141 @@
+# model_registry.py
+import gc
+import math
+import os
+import threading
+from datetime import datetime
+from time import perf_counter, sleep
+
+from predict_today import load_model, predict_probabilities
+
+MODEL_EXTENSIONS = (".joblib", ".npz")
+
+# Notes every candidate must score before it is allowed to serve traffic
+SMOKE_NOTES = [
+    "Customer liked the demo and asked about pricing.",
+    "Not interested, no budget this year.",
+    "Asked for a follow-up call next week with their CTO.",
+    "",
+]
+
+
+def resolve_artifact(path):
+    """
+    A file path is used as-is. For a directory, the artifact whose file name
+    sorts last wins, so versioned names like lead_pipeline-2024-06-01.joblib
+    roll forward by dropping a new file into the directory.
+    """
+    if not os.path.isdir(path):
+        return path if os.path.exists(path) else None
+    names = sorted(n for n in os.listdir(path) if n.endswith(MODEL_EXTENSIONS))
+    return os.path.join(path, names[-1]) if names else None
+
+
+def validate(model, notes=SMOKE_NOTES):
+    probs = predict_probabilities(model, notes)
+    if len(probs) != len(notes):
+        raise ValueError(f"Expected {len(notes)} scores, got {len(probs)}")
+    bad = [p for p in probs if not (math.isfinite(p) and 0.0 <= p <= 1.0)]
+    if bad:
+        raise ValueError(f"Smoke predictions out of range: {bad}")
+
+
+class ModelRegistry:
+    """
+    Holds the active lead model and hot-swaps it when the artifact changes.
+
+    get() is lock-free: it reads one (model, version) tuple that is replaced
+    in a single assignment, so in-flight requests keep the model they started
+    with. A daemon thread polls every poll_interval seconds; a new artifact is
+    loaded and smoke-tested off the request path and only swapped in if it
+    passes. The previous model is dropped right after the swap, so a worker
+    holds one resident copy outside the brief load window.
+    """
+
+    def __init__(self, path, poll_interval=30.0, smoke_notes=SMOKE_NOTES):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.smoke_notes = smoke_notes
+        self._active = (None, None)
+        self._fingerprint = None
+        self._reload_lock = threading.Lock()
+        self._thread = None
+        self.artifact = None
+        self.loaded_at = None
+        self.load_seconds = None
+        self.reloads = 0
+        self.last_error = None
+
+    def get(self):
+        """(model, version) currently serving; loads synchronously on first use."""
+        if self._active[0] is None and self._fingerprint is None:
+            self.reload()
+        self._ensure_watcher()
+        return self._active
+
+    def _ensure_watcher(self):
+        # Started on first use, after gunicorn has forked the worker
+        if self.poll_interval and (self._thread is None or not self._thread.is_alive()):
+            self._thread = threading.Thread(target=self._watch, name="model-registry", daemon=True)
+            self._thread.start()
+
+    def _watch(self):
+        while True:
+            sleep(self.poll_interval)
+            try:
+                self.reload()
+            except Exception as e:
+                self.last_error = str(e)
+
+    @staticmethod
+    def _stat(artifact):
+        st = os.stat(artifact)
+        return (artifact, st.st_mtime_ns, st.st_size)
+
+    def reload(self, force=False):
+        """Load, validate and swap in the artifact if it changed. Returns True on swap."""
+        with self._reload_lock:
+            artifact = resolve_artifact(self.path)
+            if artifact is None:
+                self._fingerprint = (None,)
+                self.last_error = f"No model artifact at {self.path}"
+                return False
+            fingerprint = self._stat(artifact)
+            if fingerprint == self._fingerprint and not force:
+                return False
+
+            t0 = perf_counter()
+            try:
+                model = load_model(artifact)
+                validate(model, self.smoke_notes)
+            except Exception as e:
+                # Keep serving the current model; retry only once the file changes again
+                self._fingerprint = fingerprint
+                self.last_error = f"{os.path.basename(artifact)}: {e}"
+                print(f"MODEL REGISTRY: rejected {artifact}: {e}")
+                return False
+
+            self._active = (model, model.artifact_version)
+            self._fingerprint = fingerprint
+            self.artifact = artifact
+            self.loaded_at = datetime.utcnow()
+            self.load_seconds = perf_counter() - t0
+            self.reloads += 1
+            self.last_error = None
+            gc.collect()  # free the previous model now rather than at the next GC cycle
+            print(f"MODEL REGISTRY: serving {artifact} (version {self._active[1]})")
+            return True
+
+    def status(self):
+        model, version = self._active
+        return {
+            "loaded": model is not None,
+            "version": version,
+            "artifact": self.artifact,
+            "source": self.path,
+            "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+            "load_seconds": self.load_seconds,
+            "reloads": self.reloads,
+            "poll_interval": self.poll_interval,
+            "last_error": self.last_error,
+        }
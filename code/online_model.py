@@ -0,0 +1,215 @@
+# online_model.py
+"""
+Online lead model: hashed features + SGD logistic regression, updated with partial_fit.
+
+Usage:
+  python code/online_model.py --data data/clean_sales_data.csv --out models/lead_online.joblib
+  python code/online_model.py --data exports/all_notes.csv --chunksize 50000 --holdout 20000
+  flask --app backend/app update-lead-model --model models/lead_online.joblib
+  flask --app backend/app train-online-model --holdout 20000
+
+HashingVectorizer has no vocabulary to fit: every word is hashed into a fixed
+n_features columns, so the model can learn from new notes at any time, an
+update costs time proportional to the new rows only, and the checkpoint stays
+the same size however much history it has seen. The checkpoint is a plain
+joblib artifact; point LEAD_MODEL_PATH at it and predict_today.load_model /
+the backend's ModelRegistry serve it like the TF-IDF pipeline.
+
+This script bootstraps a checkpoint from a labeled CSV, or the backend's
+train-online-model command from every labeled Feedback row; both stream the
+data (data_stream.py) and never hold the corpus in memory. The backend's
+update-lead-model command then feeds it rows as their outcomes are recorded.
+"""
+
+import argparse
+import os
+import tempfile
+from time import time
+
+import joblib
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from data_stream import ReservoirHoldout, csv_chunks
+from text_cleaner import TextCleaner
+
+CLASSES = np.array([0, 1])
+
+
+class OnlineLeadModel(BaseEstimator, ClassifierMixin):
+    """
+    TextCleaner -> HashingVectorizer -> SGDClassifier(log_loss), with partial_fit.
+
+    The coefficient vector has n_features entries whatever the corpus size.
+    n_seen_ counts the rows passed to partial_fit (again for each epoch); watermark_ is free for the
+    caller to record where in its data source the last update stopped (the
+    backend keeps the (outcome_at, id) of the last Feedback row there).
+    """
+
+    def __init__(self, n_features=2 ** 20, ngram_range=(1, 2), alpha=1e-5, remove_stopwords=True, min_token_len=2):
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+        self.alpha = alpha
+        self.remove_stopwords = remove_stopwords
+        self.min_token_len = min_token_len
+
+    def _setup(self):
+        self.cleaner_ = TextCleaner(remove_stopwords=self.remove_stopwords, min_token_len=self.min_token_len,
+                                    fast=True, tokenizer="simple")
+        # alternate_sign=False keeps term weights non-negative, like TF-IDF; l2 norm per note
+        self.vectorizer_ = HashingVectorizer(n_features=self.n_features, ngram_range=tuple(self.ngram_range),
+                                             alternate_sign=False, norm="l2")
+        self.clf_ = SGDClassifier(loss="log_loss", alpha=self.alpha, random_state=42)
+        self.n_seen_ = 0
+        self.n_updates_ = 0
+        self.watermark_ = None
+
+    @property
+    def classes_(self):
+        return CLASSES
+
+    def transform(self, texts):
+        return self.vectorizer_.transform(self.cleaner_.transform(list(texts)))
+
+    def partial_fit(self, texts, y):
+        """One SGD pass over this batch only; creates the model on first call."""
+        if not hasattr(self, "clf_"):
+            self._setup()
+        y = np.asarray(y, dtype=int)
+        self.clf_.partial_fit(self.transform(texts), y, classes=CLASSES)
+        self.n_seen_ += len(y)
+        self.n_updates_ += 1
+        return self
+
+    def fit(self, texts, y, epochs=5, batch_size=1000):
+        """Start over and make epochs shuffled passes of batch_size notes over texts."""
+        self._setup()
+        texts = np.asarray(texts, dtype=object)
+        y = np.asarray(y, dtype=int)
+        rng = np.random.default_rng(42)
+        for _ in range(epochs):
+            order = rng.permutation(len(y))
+            for start in range(0, len(y), batch_size):
+                idx = order[start:start + batch_size]
+                self.partial_fit(texts[idx], y[idx])
+        return self
+
+    def decision_function(self, texts):
+        return self.clf_.decision_function(self.transform(texts))
+
+    def predict_proba(self, texts):
+        return self.clf_.predict_proba(self.transform(texts))
+
+    def predict(self, texts):
+        return self.clf_.predict(self.transform(texts))
+
+
+def train_stream(model, make_chunks, holdout, epochs=5, batch_size=1000, seed=42):
+    """
+    Fit model from scratch out of core. make_chunks() returns a fresh iterator
+    of (texts, labels) chunks for each epoch; holdout (a ReservoirHoldout)
+    keeps its rows out of training. Rows are shuffled within each chunk, so
+    larger chunks mix a file sorted by date or label better. Returns the
+    holdout (texts, labels).
+    """
+    model._setup()
+    rng = np.random.default_rng(seed)
+    for _ in range(epochs):
+        for texts, labels in holdout.split(make_chunks()):
+            order = rng.permutation(len(labels))
+            for start in range(0, len(labels), batch_size):
+                idx = order[start:start + batch_size]
+                model.partial_fit(texts[idx], labels[idx])
+    return holdout.holdout()
+
+
+def peak_memory_mb():
+    """Peak resident memory of this process so far (MB), or None where unsupported."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if os.uname().sysname == "Darwin" else peak / 2 ** 10  # bytes on macOS, KB on Linux
+
+
+def load_checkpoint(path):
+    """The saved OnlineLeadModel, or None when there is no checkpoint yet."""
+    if not os.path.exists(path):
+        return None
+    return joblib.load(path)
+
+
+def save_checkpoint(model, path):
+    """
+    Write through a temp file and os.replace, so a ModelRegistry polling path
+    never sees half a file. Mostly-zero coefficients compress to a fraction of
+    n_features * 8 bytes.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        joblib.dump(model, tmp, compress=3)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+# -----------------
+# Bootstrap from a CSV (streamed)
+# -----------------
+def main(args):
+    from train_model import evaluate_model
+    # Run as a script this module is __main__; pickle the class under its importable name
+    from online_model import OnlineLeadModel
+
+    print("Streaming data:", args.data, f"({args.chunksize} rows per chunk)")
+    model = OnlineLeadModel(n_features=2 ** args.hash_bits, alpha=args.alpha)
+    holdout = ReservoirHoldout(size=args.holdout, max_fraction=args.test_size)
+    t0 = time()
+    X_test, y_test = train_stream(model, lambda: csv_chunks(args.data, args.chunksize), holdout,
+                                  epochs=args.epochs, batch_size=args.batch_size)
+    trained = holdout.seen - len(y_test)
+    print(f"Trained on {trained} notes x {args.epochs} epochs in {time() - t0:.1f}s; "
+          f"{len(y_test)} reservoir-sampled notes held out")
+    metrics = evaluate_model(model, X_test, y_test)
+
+    save_checkpoint(model, args.out)
+    print(f"Saved online model to {args.out} ({os.path.getsize(args.out) / 1024:.0f} KB, "
+          f"2^{args.hash_bits} hashed features)")
+    peak = peak_memory_mb()
+    if peak is not None:
+        print(f"Peak memory: {peak:.0f} MB")
+    return dict(metrics, rows=holdout.seen, peak_mb=peak)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", type=str, default="data/clean_sales_data.csv",
+                        help="CSV with note_text,label")
+    parser.add_argument("--out", type=str, default="models/lead_online.joblib",
+                        help="Checkpoint to write")
+    parser.add_argument("--holdout", type=int, default=10000,
+                        help="Rows reservoir-sampled from the stream for evaluation")
+    parser.add_argument("--test-size", type=float, default=0.2,
+                        help="Cap on the holdout as a fraction of the rows (applies to small files)")
+    parser.add_argument("--chunksize", type=int, default=10000,
+                        help="CSV rows read at a time; with --holdout this bounds memory")
+    parser.add_argument("--hash-bits", type=int, default=20,
+                        help="Hashed feature columns = 2**hash-bits (fixes model size and memory)")
+    parser.add_argument("--alpha", type=float, default=1e-5,
+                        help="SGD L2 regularization")
+    parser.add_argument("--epochs", type=int, default=5,
+                        help="Shuffled passes over the CSV")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="Notes per partial_fit call")
+    args = parser.parse_args()
+    main(args)
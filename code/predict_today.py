@@ -1,33 +1,168 @@
 # predict_today.py
 
+import hashlib
 import joblib
 import os
+import re
+from collections import Counter
+import numpy as np
 from text_cleaner import TextCleaner   # <-- FIXED import
+from prediction_cache import PredictionCache
 
 MODEL_PATH = os.environ.get("LEAD_MODEL_PATH", "models/lead_pipeline.joblib")
 
+# Shared by the backend, the chatbot and code/server.py
+PREDICTION_CACHE = PredictionCache(
+    maxsize=int(os.environ.get("LEAD_CACHE_SIZE", 10000)),
+    ttl=float(os.environ.get("LEAD_CACHE_TTL", 3600)),
+    watch_path=MODEL_PATH,
+)
+
+def model_version(path):
+    """Short content hash of a model artifact."""
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()[:12]
+
 def load_model(path=None):
     if path is None:
         path = MODEL_PATH
     if not os.path.exists(path):
         return None
-    model = joblib.load(path)
+    if path.endswith(".npz"):
+        model = load_linear_model(path)
+    else:
+        model = joblib.load(path)
+    model.artifact_version = model_version(path)
     return model
 
-def predict_probability(model, text):
+# -----------------
+# Linear engine (exported by train_model.py --export-linear)
+# -----------------
+class LinearLeadModel:
+    """
+    TF-IDF + calibrated LogisticRegression scored with plain NumPy.
+    Exposes predict_proba so it can stand in for the joblib pipeline.
+    """
+
+    def __init__(self, arrays):
+        self.terms = arrays["terms"]
+        self.vocabulary = {term: i for i, term in enumerate(self.terms.tolist())}
+        self.idf = arrays["idf"]
+        self.intercept = arrays["intercept"]
+        self.sigmoid_a = arrays["sigmoid_a"]
+        self.sigmoid_b = arrays["sigmoid_b"]
+        self.ngram_range = tuple(int(n) for n in arrays["ngram_range"])
+        self.lowercase = bool(arrays["lowercase"])
+        self.token_re = re.compile(str(arrays["token_pattern"]))
+
+        # Expand the pruned coefficients into one dense row per head
+        ptr = arrays["coef_ptr"]
+        self.coef = np.zeros((len(self.intercept), len(self.terms)), dtype=np.float32)
+        for h in range(len(self.intercept)):
+            self.coef[h, arrays["coef_idx"][ptr[h]:ptr[h + 1]]] = arrays["coef_val"][ptr[h]:ptr[h + 1]]
+
+        self.cleaner = TextCleaner(remove_stopwords=bool(arrays["remove_stopwords"]),
+                                   min_token_len=int(arrays["min_token_len"]),
+                                   fast=True, tokenizer="simple")
+
+    def _term_counts(self, doc):
+        if self.lowercase:
+            doc = doc.lower()
+        tokens = self.token_re.findall(doc)
+        grams = []
+        min_n, max_n = self.ngram_range
+        for n in range(min_n, max_n + 1):
+            grams.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        counts = Counter(self.vocabulary[g] for g in grams if g in self.vocabulary)
+        cols = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        tf = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        return cols, tf
+
+    def decision_functions(self, texts):
+        """Raw LogisticRegression scores, shape (n_texts, n_heads)."""
+        cleaned = self.cleaner.transform(texts)
+        out = np.tile(self.intercept.astype(np.float64), (len(cleaned), 1))
+        for row, doc in enumerate(cleaned):
+            cols, tf = self._term_counts(doc)
+            if not len(cols):
+                continue
+            w = tf * self.idf[:, cols]                       # (heads or 1, nnz)
+            norm = np.sqrt((w * w).sum(axis=1, keepdims=True))
+            w = np.divide(w, norm, out=np.zeros_like(w), where=norm > 0)
+            out[row] += (w * self.coef[:, cols]).sum(axis=1)
+        return out
+
+    def predict_proba(self, texts):
+        scores = self.decision_functions(texts)
+        pos = (1 / (1 + np.exp(self.sigmoid_a * scores + self.sigmoid_b))).mean(axis=1)
+        return np.column_stack([1 - pos, pos])
+
+def load_linear_model(path):
+    # allow_pickle=False: the file is only arrays, never arbitrary objects
+    with np.load(path, allow_pickle=False) as arrays:
+        return LinearLeadModel(arrays)
+
+def label_for_score(prob):
+    """Map a conversion probability to the High/Medium/Low buckets used by the UI."""
+    if prob >= 0.7:
+        return "High"
+    if prob >= 0.45:
+        return "Medium"
+    return "Low"
+
+def predict_probabilities(model, texts):
+    """Score many notes with one vectorized pipeline call. Returns floats in input order."""
     if model is None:
         raise RuntimeError("Model not loaded")
-    
+
+    texts = list(texts)
+    if not texts:
+        return []
+
     try:
-        # This will now succeed
-        prob = model.predict_proba([text])[0][1]
-        return float(prob)
+        probs = model.predict_proba(texts)[:, 1]
     except Exception:
-        # If it ever fails again, it will fail "quietly"
-        try:
-            score = model.decision_function([text])[0]
-            import math
-            prob = 1 / (1 + math.exp(-score))
-            return float(prob)
-        except Exception:
-            raise # Or just return 0.0 to show "Error"
\ No newline at end of file
+        # Models without predict_proba: squash the decision function instead
+        scores = np.asarray(model.decision_function(texts), dtype=float)
+        probs = 1 / (1 + np.exp(-scores))
+    return [float(p) for p in probs]
+
+def predict_probability(model, text):
+    return predict_probabilities(model, [text])[0]
+
+def predict_leads(model, texts, cache=PREDICTION_CACHE, scorer=None):
+    """
+    (probability, label) per note, in input order. Cache hits skip the model;
+    all misses are scored together in one call to scorer(texts), which defaults
+    to predict_probabilities on model (e.g. pass MicroBatcher.submit_many).
+    """
+    if model is None:
+        raise RuntimeError("Model not loaded")
+    if scorer is None:
+        scorer = lambda batch: predict_probabilities(model, batch)
+
+    texts = list(texts)
+    if cache is None:
+        return [(p, label_for_score(p)) for p in scorer(texts)]
+
+    version = getattr(model, "artifact_version", None) or f"id:{id(model)}"
+    results = [cache.get(t, version) for t in texts]
+    missing = {}
+    for i, r in enumerate(results):
+        if r is None:
+            missing.setdefault(PredictionCache.key(texts[i], version), []).append(i)
+    if missing:
+        firsts = [idx[0] for idx in missing.values()]
+        probs = scorer([texts[i] for i in firsts])
+        for idx, p in zip(missing.values(), probs):
+            result = (p, label_for_score(p))
+            cache.put(texts[idx[0]], version, result)
+            for i in idx:
+                results[i] = result
+    return results
+
+def predict_lead(model, text, cache=PREDICTION_CACHE, scorer=None):
+    return predict_leads(model, [text], cache=cache, scorer=scorer)[0]
@@ -0,0 +1,111 @@
+# prediction_cache.py
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from time import monotonic
+
+
+def normalize_text(text):
+    # TextCleaner lowercases and splits on whitespace, so these variants score identically
+    return " ".join(str(text).lower().split())
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU + TTL cache of (probability, label) per note.
+
+    Keys are sha1(model version + normalized text), so entries from one model
+    can never answer for another. When watch_path is set, the file is stat'ed
+    at most every check_interval seconds and the cache is dropped if it changed.
+    """
+
+    def __init__(self, maxsize=10000, ttl=3600, watch_path=None, check_interval=2.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.watch_path = watch_path
+        self.check_interval = check_interval
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._fingerprint = self._stat()
+        self._next_check = monotonic() + check_interval
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _stat(self):
+        if not self.watch_path:
+            return None
+        try:
+            st = os.stat(self.watch_path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    @staticmethod
+    def key(text, version):
+        return hashlib.sha1(f"{version}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _check_invalidation(self, version, now):
+        # Called with the lock held
+        if version != self._version:
+            if self._data:
+                self.invalidations += 1
+            self._data.clear()
+            self._version = version
+        if self.watch_path and now >= self._next_check:
+            self._next_check = now + self.check_interval
+            fingerprint = self._stat()
+            if fingerprint != self._fingerprint:
+                self._fingerprint = fingerprint
+                self._data.clear()
+                self.invalidations += 1
+
+    def get(self, text, version):
+        if self.maxsize <= 0:
+            return None
+        k = self.key(text, version)
+        now = monotonic()
+        with self._lock:
+            self._check_invalidation(version, now)
+            entry = self._data.get(k)
+            if entry is None or entry[1] < now:
+                if entry is not None:
+                    del self._data[k]
+                self.misses += 1
+                return None
+            self._data.move_to_end(k)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, text, version, value):
+        if self.maxsize <= 0:
+            return
+        k = self.key(text, version)
+        now = monotonic()
+        with self._lock:
+            self._check_invalidation(version, now)
+            self._data[k] = (value, now + self.ttl)
+            self._data.move_to_end(k)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "model_version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,95 @@
+# sentiment.py
+import hashlib
+import os
+import threading
+from importlib.metadata import version
+
+from textblob.en import sentiment as pattern_sentiment
+from prediction_cache import PredictionCache
+
+# The pattern lexicon ships inside textblob, so the package version identifies it
+LEXICON_VERSION = f"textblob-{version('textblob')}"
+
+
+class SentimentCache(PredictionCache):
+    """
+    PredictionCache keyed on the exact text. Unlike the lead model, the pattern
+    lexicon reacts to case, punctuation and emoticons ("!!", ":)"), so notes are
+    not normalized before hashing.
+    """
+
+    @staticmethod
+    def key(text, version):
+        return hashlib.sha1(f"{version}\0{text}".encode("utf-8")).hexdigest()
+
+
+def sentiment_label(polarity):
+    """Map a polarity score to the Positive/Neutral/Negative buckets used by the UI."""
+    if polarity > 0.2:
+        return "Positive"
+    if polarity < -0.1:
+        return "Negative"
+    return "Neutral"
+
+
+class SentimentService:
+    """
+    Polarity/subjectivity scores identical to TextBlob(text).sentiment.
+
+    TextBlob builds a blob (tokenizer, tagger and analyzer wiring) per text just
+    to call the module-level pattern analyzer. This calls that analyzer directly,
+    loads its lexicon once under a lock (textblob's lazy dict is not safe to
+    fill from two threads at once), and caches results by text hash.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache
+        self._load_lock = threading.Lock()
+        self._loaded = False
+
+    def load(self):
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    pattern_sentiment.load()
+                    self._loaded = True
+
+    @staticmethod
+    def _analyze(text):
+        if not text or not text.strip():
+            return (0.0, 0.0)
+        polarity, subjectivity = pattern_sentiment(text)
+        return (polarity, subjectivity)
+
+    def score_many(self, texts, cached=True):
+        """
+        (polarity, subjectivity) per text, in input order. Repeated texts are
+        scored once. cached=False bypasses the cache, for bulk jobs whose texts
+        would only evict the hot entries.
+        """
+        self.load()
+        texts = list(texts)
+        if self.cache is None or not cached:
+            return [self._analyze(t) for t in texts]
+
+        results = [self.cache.get(t, LEXICON_VERSION) for t in texts]
+        missing = {}
+        for i, r in enumerate(results):
+            if r is None:
+                missing.setdefault(texts[i], []).append(i)
+        for text, idx in missing.items():
+            result = self._analyze(text)
+            self.cache.put(text, LEXICON_VERSION, result)
+            for i in idx:
+                results[i] = result
+        return results
+
+    def score(self, text):
+        return self.score_many([text])[0]
+
+
+# Shared by the backend, analysis.py and the chatbot
+SENTIMENT = SentimentService(cache=SentimentCache(
+    maxsize=int(os.environ.get("SENTIMENT_CACHE_SIZE", 10000)),
+    ttl=float(os.environ.get("SENTIMENT_CACHE_TTL", 86400)),
+))
@@ -7,6 +7,7 @@ Run: python code/server.py
 from flask import Flask, request, jsonify
 import joblib
 from chatbot_brain import handle
+from predict_today import PREDICTION_CACHE
 
 # -----------------
 # Setup
@@ -75,6 +76,12 @@ def health():
     return {"status": "ok", "message": "Chatbot brain API running"}
 
 
+@app.route("/stats", methods=["GET"])
+def stats():
+    """Prediction cache size and hit rate."""
+    return jsonify({"prediction_cache": PREDICTION_CACHE.stats()})
+
+
 # -----------------
 # Run server
 # -----------------
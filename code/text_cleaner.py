@@ -1,47 +1,194 @@
 # text_cleaner.py
+import os
 import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 import nltk
 from sklearn.base import BaseEstimator, TransformerMixin
 from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer
 
-# Ensure NLTK resources are available (no noisy output)
-nltk.download('punkt', quiet=True)
-nltk.download('stopwords', quiet=True)
-nltk.download('wordnet', quiet=True)
-nltk.download('omw-1.4', quiet=True)
+# Ensure NLTK resources are available (no noisy output). nltk.download() contacts
+# the index even for installed packages, so only call it for missing ones.
+for _resource, _package in [('tokenizers/punkt', 'punkt'), ('corpora/stopwords', 'stopwords'),
+                            ('corpora/wordnet', 'wordnet'), ('corpora/omw-1.4', 'omw-1.4')]:
+    try:
+        nltk.data.find(_resource)
+    except LookupError:
+        nltk.download(_package, quiet=True)
+
+# Compiled once at import instead of on every note
+URL_RE = re.compile(r'http\S+|www\.\S+')
+EMAIL_RE = re.compile(r'\S+@\S+')
+NON_ALNUM_RE = re.compile(r'[^a-z0-9\s]')
+
+# After NON_ALNUM_RE only [a-z0-9] and whitespace are left, and on such text
+# nltk.word_tokenize reduces to str.split() plus these whole-word contraction
+# splits (NLTKWordTokenizer.CONTRACTIONS2 without the apostrophe cases).
+SIMPLE_SPLITS = {
+    'cannot': ('can', 'not'),
+    'gimme': ('gim', 'me'),
+    'gonna': ('gon', 'na'),
+    'gotta': ('got', 'ta'),
+    'lemme': ('lem', 'me'),
+    'wanna': ('wan', 'na'),
+}
+
+def simple_tokenize(s):
+    """Token-for-token equivalent of nltk.word_tokenize on already-stripped text."""
+    toks = []
+    for t in s.split():
+        split = SIMPLE_SPLITS.get(t)
+        if split:
+            toks.extend(split)
+        else:
+            toks.append(t)
+    return toks
+
+
+class LemmaCache:
+    """Bounded, thread-safe LRU of token -> lemma with hit/miss counters."""
+
+    def __init__(self, maxsize=50000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lemmatize(self, lemmatizer, token):
+        with self._lock:
+            lemma = self._data.get(token)
+            if lemma is not None:
+                self._data.move_to_end(token)
+                self.hits += 1
+                return lemma
+            self.misses += 1
+        # WordNet lookup happens outside the lock
+        lemma = lemmatizer.lemmatize(token)
+        with self._lock:
+            self._data[token] = lemma
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return lemma
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+
+# WordNetLemmatizer is stateless, so one memo serves every TextCleaner in the process
+LEMMA_CACHE = LemmaCache(int(os.environ.get("LEMMA_CACHE_SIZE", 50000)))
+
+
+# -----------------
+# Process pool workers
+# -----------------
+_WORKER_CLEANER = None
+
+def _init_worker(params):
+    # Runs once per worker process: stopwords and lemmatizer are built here, not per chunk
+    global _WORKER_CLEANER
+    _WORKER_CLEANER = TextCleaner(**params)
+
+def _clean_chunk(docs):
+    return [_WORKER_CLEANER._clean_one(d) for d in docs]
+
 
 class TextCleaner(BaseEstimator, TransformerMixin):
-    def __init__(self, remove_stopwords=True, min_token_len=2):
+    """
+    fast=True memoizes lemmas in LEMMA_CACHE; tokenizer='simple' swaps
+    nltk.word_tokenize for simple_tokenize. Both produce identical output.
+
+    n_jobs > 1 (or -1 for all cores) splits inputs of at least 2 * chunk_size
+    documents across a process pool; smaller inputs stay in-process.
+    """
+
+    def __init__(self, remove_stopwords=True, min_token_len=2, fast=False, tokenizer="nltk",
+                 n_jobs=None, chunk_size=1000):
         self.remove_stopwords = remove_stopwords
         self.min_token_len = min_token_len
+        self.fast = fast
+        self.tokenizer = tokenizer
+        self.n_jobs = n_jobs
+        self.chunk_size = chunk_size
         self.stopwords = set(stopwords.words('english'))
         self.lemmatizer = WordNetLemmatizer()
 
+    def __setstate__(self, state):
+        # Pipelines pickled before these options existed keep the original behaviour
+        state.setdefault('fast', False)
+        state.setdefault('tokenizer', 'nltk')
+        state.setdefault('n_jobs', None)
+        state.setdefault('chunk_size', 1000)
+        super().__setstate__(state)
+
     def fit(self, X, y=None):
         return self
 
+    def _tokenize(self, s):
+        if self.tokenizer == "simple":
+            return simple_tokenize(s)
+        try:
+            return nltk.word_tokenize(s)
+        except LookupError:
+            nltk.download('punkt')
+            return nltk.word_tokenize(s)
+
     def _clean_one(self, doc):
         if not isinstance(doc, str):
             return ""
         s = doc.lower()
-        s = re.sub(r'http\S+|www\.\S+', ' ', s)
-        s = re.sub(r'\S+@\S+', ' ', s)
-        s = re.sub(r'[^a-z0-9\s]', ' ', s)
-        try:
-            tokens = nltk.word_tokenize(s)
-        except LookupError:
-            nltk.download('punkt')
-            tokens = nltk.word_tokenize(s)
+        s = URL_RE.sub(' ', s)
+        s = EMAIL_RE.sub(' ', s)
+        s = NON_ALNUM_RE.sub(' ', s)
+        tokens = self._tokenize(s)
         toks = []
         for t in tokens:
             if self.remove_stopwords and t in self.stopwords:
                 continue
             if len(t) < self.min_token_len:
                 continue
-            t = self.lemmatizer.lemmatize(t)
+            if self.fast:
+                t = LEMMA_CACHE.lemmatize(self.lemmatizer, t)
+            else:
+                t = self.lemmatizer.lemmatize(t)
             toks.append(t)
         return " ".join(toks)
 
+    def _effective_jobs(self):
+        if self.n_jobs is None:
+            return 1
+        if self.n_jobs < 0:
+            return max(1, (os.cpu_count() or 1) + 1 + self.n_jobs)
+        return self.n_jobs
+
     def transform(self, X):
-        return [self._clean_one(x) for x in X]
+        X = list(X)
+        n_jobs = self._effective_jobs()
+        if n_jobs <= 1 or len(X) < 2 * self.chunk_size:
+            return [self._clean_one(x) for x in X]
+
+        chunks = [X[i:i + self.chunk_size] for i in range(0, len(X), self.chunk_size)]
+        params = self.get_params()
+        params['n_jobs'] = None  # workers clean their chunk in-process
+        out = []
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(chunks)),
+                                 initializer=_init_worker, initargs=(params,)) as pool:
+            # map() yields results in submission order, so output order matches X
+            for part in pool.map(_clean_chunk, chunks):
+                out.extend(part)
+        return out
@@ -1,11 +1,17 @@
 # train_model.py
 import argparse
+import hashlib
 import os
 import joblib
+import numpy as np
 import pandas as pd
 from time import time
+from sklearn.base import clone
 from sklearn.pipeline import Pipeline
 from sklearn.model_selection import StratifiedKFold, train_test_split, RandomizedSearchCV
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401  (exposes HalvingRandomSearchCV)
+from sklearn.model_selection import HalvingRandomSearchCV
+from joblib import effective_n_jobs
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
 from sklearn.calibration import CalibratedClassifierCV
@@ -55,6 +61,226 @@ def evaluate_model(model, X_test, y_test):
     return {"accuracy": acc, "precision": prec, "recall": rec, "f1": f1, "roc_auc": roc}
 
 
+# -----------------
+# Calibration layouts
+# -----------------
+def build_calibrated(best_pipe, cv, layout="shared", n_jobs=None):
+    """
+    'ensemble': CalibratedClassifierCV around the whole pipeline, so the saved
+                artifact holds k copies of cleaner + TF-IDF and every prediction
+                cleans and vectorizes the note k times.
+    'shared':   cleaner + TF-IDF fitted once on the training split, followed by
+                k calibrated LogisticRegression heads. Same predict_proba API.
+    """
+    if layout == "ensemble":
+        return CalibratedClassifierCV(estimator=best_pipe, method='sigmoid', cv=cv, n_jobs=n_jobs)
+
+    features = clone(best_pipe).steps[:-1]
+    head = clone(best_pipe.named_steps['clf'])
+    return Pipeline(features + [
+        ('clf', CalibratedClassifierCV(estimator=head, method='sigmoid', cv=cv, n_jobs=n_jobs))
+    ])
+
+
+# -----------------
+# Time-budgeted search
+# -----------------
+class _BudgetExhausted(Exception):
+    pass
+
+
+class TimeBudgetMixin:
+    """
+    Stops a scikit-learn search once time_budget seconds have passed (None =
+    no limit). Candidates reach evaluate_candidates budget_chunk at a time and
+    the clock is checked between chunks, so the search overruns by at most one
+    chunk. The best candidate scored so far (for halving: in the last round
+    reached) is then refit as usual; budget_exhausted_ records whether the
+    budget cut the search short.
+
+    Set as attributes rather than __init__ parameters so the sklearn
+    constructors stay untouched.
+    """
+    time_budget = None
+    budget_chunk = 1
+
+    def _run_search(self, evaluate_candidates, *, callback_ctx=None):
+        # scikit-learn >= 1.9 threads a callback context through; older versions don't
+        ctx = {} if callback_ctx is None else {'callback_ctx': callback_ctx}
+        self.budget_exhausted_ = False
+        if not self.time_budget:
+            return super()._run_search(evaluate_candidates, **ctx)
+
+        deadline = time() + self.time_budget
+        evaluated = 0
+
+        def budgeted(candidate_params, cv=None, more_results=None, **_):
+            # Per-chunk calls can't share one callback context (task ids would repeat), so none is passed on
+            nonlocal evaluated
+            candidate_params = list(candidate_params)
+            results = None
+            for i in range(0, len(candidate_params), self.budget_chunk):
+                if evaluated and time() >= deadline:
+                    raise _BudgetExhausted
+                part = slice(i, i + self.budget_chunk)
+                part_results = {k: v[part] for k, v in more_results.items()} if more_results else None
+                results = evaluate_candidates(candidate_params[part], cv, more_results=part_results)
+                evaluated += len(candidate_params[part])
+            return results
+
+        try:
+            super()._run_search(budgeted, **ctx)
+        except _BudgetExhausted:
+            self.budget_exhausted_ = True
+
+
+class BudgetedRandomizedSearchCV(TimeBudgetMixin, RandomizedSearchCV):
+    pass
+
+
+class BudgetedHalvingRandomSearchCV(TimeBudgetMixin, HalvingRandomSearchCV):
+    pass
+
+
+def build_search(pipeline, param_dist, cv, args):
+    """
+    'random':  RandomizedSearchCV, n_iter candidates on the full training split.
+    'halving': successive halving; n_iter candidates start on a small sample
+               and each round keeps the best 1/factor on factor times more rows,
+               so cost grows with log(n_iter) rather than n_iter.
+    """
+    common = dict(param_distributions=param_dist, scoring='f1', cv=cv, verbose=1, random_state=42,
+                  n_jobs=args.n_jobs)   # default 1: single-process, safe on Windows
+    if args.search == 'halving':
+        search = BudgetedHalvingRandomSearchCV(
+            pipeline, n_candidates=args.n_iter, factor=args.halving_factor,
+            resource='n_samples', min_resources='exhaust', **common
+        )
+    else:
+        search = BudgetedRandomizedSearchCV(pipeline, n_iter=args.n_iter, **common)
+    search.time_budget = args.time_budget
+    search.budget_chunk = max(1, effective_n_jobs(args.n_jobs))  # keep every worker busy between checks
+    return search
+
+
+# -----------------
+# Cleaned-corpus cache
+# -----------------
+# TextCleaner is stateless (fit is a no-op) and cleans each note on its own,
+# so cleaning the corpus up front gives every CV fold exactly the text the
+# in-pipeline cleaner would have produced.
+CLEAN_CACHE_VERSION = 1
+
+def clean_cache_key(X, cleaner):
+    """Hash of the notes, the cleaner settings that shape its output and the NLTK version."""
+    params = {k: v for k, v in cleaner.get_params().items() if k not in ('n_jobs', 'chunk_size')}
+    h = hashlib.sha256(f"{CLEAN_CACHE_VERSION}|{nltk.__version__}|{sorted(params.items())}".encode())
+    for x in X:
+        h.update(x.encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()[:20]
+
+
+def clean_corpus(X, cleaner, cache_dir=None):
+    """cleaner.transform(X) as an object array; read from / written to cache_dir when given."""
+    path = os.path.join(cache_dir, f"clean-{clean_cache_key(X, cleaner)}.joblib") if cache_dir else None
+    if path and os.path.exists(path):
+        print("Loaded cleaned corpus from cache:", path)
+        return joblib.load(path)
+
+    t0 = time()
+    X_clean = np.asarray(cleaner.transform(X), dtype=object)
+    print(f"Cleaned {len(X)} notes in {time() - t0:.1f}s")
+    if path:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        joblib.dump(X_clean, tmp)
+        os.replace(tmp, path)  # readers never see a half-written file
+        print("Cached cleaned corpus to:", path)
+    return X_clean
+
+
+# -----------------
+# Linear engine export
+# -----------------
+LINEAR_FORMAT_VERSION = 1
+
+def _linear_heads(model):
+    """Yield (cleaner, tfidf, logreg, calibrator) for every calibrated fold in either layout."""
+    if isinstance(model, Pipeline):
+        cleaner, tfidf = model.named_steps['clean'], model.named_steps['tfidf']
+        for cc in model.named_steps['clf'].calibrated_classifiers_:
+            yield cleaner, tfidf, cc.estimator, cc.calibrators[0]
+    elif isinstance(model, CalibratedClassifierCV):
+        for cc in model.calibrated_classifiers_:
+            pipe = cc.estimator
+            yield pipe.named_steps['clean'], pipe.named_steps['tfidf'], pipe.named_steps['clf'], cc.calibrators[0]
+    else:
+        raise ValueError(f"Cannot export model of type {type(model).__name__}")
+
+
+def export_linear(model, path):
+    """
+    Write the calibrated TF-IDF + LogisticRegression model as plain NumPy arrays
+    (loaded by predict_today.load_linear_model, no pickle involved).
+
+    The vocabulary is the union over folds; a term a fold never saw gets idf 0 for
+    that fold. Every term is kept because the L2 norm of a TF-IDF row depends on
+    all of them, but only non-zero coefficients are stored.
+    """
+    heads = list(_linear_heads(model))
+    cleaner, tfidf = heads[0][0], heads[0][1]
+    for c, t, _, cal in heads:
+        if (c.remove_stopwords, c.min_token_len) != (cleaner.remove_stopwords, cleaner.min_token_len):
+            raise ValueError("All folds must share the same TextCleaner settings")
+        if t.analyzer != 'word' or t.norm != 'l2' or not t.use_idf or t.sublinear_tf or t.binary:
+            raise ValueError("Only word n-gram, l2-normalised, idf-weighted TF-IDF can be exported")
+        if t.ngram_range != tfidf.ngram_range or t.token_pattern != tfidf.token_pattern:
+            raise ValueError("All folds must share the same TF-IDF tokenisation")
+        if not hasattr(cal, 'a_'):
+            raise ValueError("Only sigmoid calibration can be exported")
+
+    terms = sorted(set().union(*(t.vocabulary_ for _, t, _, _ in heads)))
+    index = {term: i for i, term in enumerate(terms)}
+
+    idf = np.zeros((len(heads), len(terms)), dtype=np.float32)
+    coef_ptr, coef_idx, coef_val = [0], [], []
+    for h, (_, t, clf, _) in enumerate(heads):
+        cols = np.array([index[term] for term in t.get_feature_names_out()], dtype=np.int32)
+        idf[h, cols] = t.idf_
+        coef = clf.coef_.ravel()
+        keep = np.flatnonzero(coef)
+        coef_idx.append(cols[keep])
+        coef_val.append(coef[keep].astype(np.float32))
+        coef_ptr.append(coef_ptr[-1] + len(keep))
+
+    # One shared vectorizer (the default 'shared' layout) -> store its idf row once
+    if all(t is tfidf for _, t, _, _ in heads):
+        idf = idf[:1]
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, 'wb') as fh:
+        np.savez(
+            fh,
+            format_version=np.int32(LINEAR_FORMAT_VERSION),
+            terms=np.array(terms, dtype=str),
+            idf=idf,
+            coef_ptr=np.array(coef_ptr, dtype=np.int32),
+            coef_idx=np.concatenate(coef_idx).astype(np.int32),
+            coef_val=np.concatenate(coef_val),
+            intercept=np.array([clf.intercept_[0] for _, _, clf, _ in heads], dtype=np.float32),
+            sigmoid_a=np.array([cal.a_ for _, _, _, cal in heads], dtype=np.float64),
+            sigmoid_b=np.array([cal.b_ for _, _, _, cal in heads], dtype=np.float64),
+            ngram_range=np.array(tfidf.ngram_range, dtype=np.int32),
+            token_pattern=np.array(tfidf.token_pattern),
+            lowercase=np.bool_(tfidf.lowercase),
+            remove_stopwords=np.bool_(cleaner.remove_stopwords),
+            min_token_len=np.int32(cleaner.min_token_len),
+        )
+    kept = coef_ptr[-1]
+    print(f"Exported linear engine to: {path} ({len(terms)} terms, {len(heads)} heads, {kept} non-zero weights)")
+
+
 # -----------------
 # Main training pipeline
 # -----------------
@@ -67,15 +293,25 @@ def main(args):
     X = df['note_text'].fillna('').astype(str).values
     y = df['label'].astype(int).values
 
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=args.test_size, random_state=42, stratify=y
-    )
-
-    pipeline = Pipeline([
-        ('clean', TextCleaner()),
+    cleaner = TextCleaner(fast=True, tokenizer='simple', n_jobs=args.clean_jobs)
+    model_steps = [
         ('tfidf', TfidfVectorizer(max_features=10000, ngram_range=(1, 2))),
         ('clf', LogisticRegression(solver='saga', max_iter=2000, class_weight='balanced'))
-    ])
+    ]
+
+    if args.clean == 'once':
+        # Search and calibrate on pre-cleaned text; the cleaner is put back in front for the artifact
+        X_clean = clean_corpus(X, cleaner, args.clean_cache)
+        X_train, X_test, X_fit, _, y_train, y_test = train_test_split(
+            X, X_clean, y, test_size=args.test_size, random_state=42, stratify=y
+        )
+        pipeline = Pipeline(model_steps)
+    else:
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=args.test_size, random_state=42, stratify=y
+        )
+        X_fit = X_train
+        pipeline = Pipeline([('clean', cleaner)] + model_steps)
 
     param_dist = {
         'tfidf__max_features': [3000, 5000, 8000, 10000],
@@ -87,35 +323,50 @@ def main(args):
     n_splits = min(5, max(2, len(y_train)))
     cv = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=42)
 
-    search = RandomizedSearchCV(
-        pipeline,
-        param_distributions=param_dist,
-        n_iter=args.n_iter,
-        scoring='f1',
-        n_jobs=1,   # single-process on Windows (safe)
-        cv=cv,
-        verbose=1,
-        random_state=42
-    )
-
-    print("Starting RandomizedSearchCV... (this can take a bit)")
+    search = build_search(pipeline, param_dist, cv, args)
+    budget = f", time budget {args.time_budget:g}s" if args.time_budget else ""
+    print(f"Starting {args.search} search (n_jobs={args.n_jobs}, clean={args.clean}{budget})... (this can take a bit)")
     t0 = time()
-    search.fit(X_train, y_train)
-    print(f"RandomizedSearchCV finished in {time() - t0:.1f}s")
+    search.fit(X_fit, y_train)
+    search_time = time() - t0
+    n_candidates = len(search.cv_results_['params'])
+    print(f"{type(search).__name__} finished in {search_time:.1f}s")
+    if search.budget_exhausted_:
+        print(f"Time budget reached after {n_candidates} candidate evaluations; keeping the best so far")
     print("Best params:", search.best_params_)
     best_pipe = search.best_estimator_
 
-    print("Calibrating probabilities (Platt scaling)...")
-    calibrated = CalibratedClassifierCV(estimator=best_pipe, method='sigmoid', cv=cv)
-    calibrated.fit(X_train, y_train)
+    print(f"Calibrating probabilities (Platt scaling, {args.calibration} layout)...")
+    if args.clean == 'once' and args.calibration == 'shared':
+        calibrated = build_calibrated(best_pipe, cv, 'shared', n_jobs=args.n_jobs)
+        calibrated.fit(X_fit, y_train)
+        calibrated = Pipeline([('clean', cleaner.fit(X_train))] + calibrated.steps)
+    else:
+        if args.clean == 'once':
+            best_pipe = Pipeline([('clean', cleaner)] + best_pipe.steps)
+        # The ensemble layout refits whole pipelines, cleaner included, on raw text
+        calibrated = build_calibrated(best_pipe, cv, args.calibration, n_jobs=args.n_jobs)
+        calibrated.fit(X_train, y_train)
 
     print("\nEvaluating on test set...")
-    evaluate_model(calibrated, X_test, y_test)
+    metrics = evaluate_model(calibrated, X_test, y_test)
 
     os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
     joblib.dump(calibrated, args.out)
     print("Saved calibrated pipeline to:", args.out)
+    if args.export_linear:
+        export_linear(calibrated, args.export_linear)
+
+    summary = {
+        'search': args.search, 'n_iter': args.n_iter, 'candidates': n_candidates,
+        'search_seconds': search_time, 'budget_exhausted': search.budget_exhausted_,
+        'best_cv_f1': search.best_score_, 'test_f1': metrics['f1'],
+    }
+    print(f"\nSearch summary: {args.search:<8} n_iter={args.n_iter:<3} candidate fits={n_candidates:<3} "
+          f"time={search_time:6.1f}s{' (budget hit)' if search.budget_exhausted_ else ''} | "
+          f"best CV F1={search.best_score_:.4f} | test F1={metrics['f1']:.4f}")
     print("Done.")
+    return summary
 
 
 # -----------------
@@ -130,6 +381,24 @@ if __name__ == "__main__":
     parser.add_argument("--test-size", type=float, default=0.2,
                         help="Test split fraction")
     parser.add_argument("--n-iter", type=int, default=8,
-                        help="RandomizedSearchCV iterations")
+                        help="Candidates to sample (random: fits on the full split; halving: first-round candidates)")
+    parser.add_argument("--search", choices=["random", "halving"], default="random",
+                        help="random: RandomizedSearchCV; halving: successive halving over training samples")
+    parser.add_argument("--halving-factor", type=int, default=3,
+                        help="halving: keep 1/factor of the candidates per round, on factor times more samples")
+    parser.add_argument("--time-budget", type=float, default=None,
+                        help="Stop the search after this many seconds and keep the best candidate so far")
+    parser.add_argument("--calibration", choices=["shared", "ensemble"], default="shared",
+                        help="shared: vectorize once + k calibrated heads; ensemble: k full pipelines (legacy)")
+    parser.add_argument("--clean-jobs", type=int, default=None,
+                        help="Processes for TextCleaner on large inputs (-1 = all cores)")
+    parser.add_argument("--clean", choices=["once", "per-fold"], default="once",
+                        help="once: clean the corpus a single time before the search; per-fold: cleaner inside the searched pipeline (old behaviour)")
+    parser.add_argument("--clean-cache", type=str, default="models/.clean_cache",
+                        help="Directory caching the cleaned corpus by data + cleaner settings ('' to disable)")
+    parser.add_argument("--n-jobs", type=int, default=1,
+                        help="Parallel search/calibration fits (-1 = all cores; Linux/macOS)")
+    parser.add_argument("--export-linear", type=str, default=None,
+                        help="Also write the sklearn-free linear engine (.npz) to this path")
     args = parser.parse_args()
     main(args)